@@ -0,0 +1,103 @@
+"""
+Benchmark loading the overworld whole (`world:read`) versus loading only the
+chunks around the party (`world:read_chunk`), reporting the size of the
+payloads the server would send along with the time taken to load them and
+the memory the loaded overworld uses.
+
+    python -m benchmarks.chunks
+"""
+
+import json
+import time
+import tracemalloc
+
+from benchmarks.payloads import world_payload
+from game.entities.overworld import Overworld
+from game.settings import settings
+
+
+def chunk_payloads(world_json):
+    """
+    Return the `world:read_chunk` payloads for the chunks around the centre
+    of the world.
+    """
+
+    w, h = world_json['size']
+    tiles = world_json['tiles']
+    chunk_size = settings.game.chunk_size
+    radius = settings.game.chunk_load_radius
+
+    cy = h // 2 // chunk_size
+    cx = w // 2 // chunk_size
+
+    payloads = []
+    for ky in range(max(0, cy - radius), cy + radius + 1):
+        for kx in range(max(0, cx - radius), cx + radius + 1):
+            x, y = kx * chunk_size, ky * chunk_size
+            cw = min(chunk_size, w - x)
+            ch = min(chunk_size, h - y)
+
+            payloads.append({
+                'world_size': [w, h],
+                'position': [x, y],
+                'size': [cw, ch],
+                'tiles': [
+                    tiles[ty * w + tx]
+                    for ty in range(y, y + ch)
+                    for tx in range(x, x + cw)
+                ]
+            })
+
+    return payloads
+
+
+def load_chunks(payloads):
+    """Load an overworld from chunk payloads"""
+
+    w, h = payloads[0]['world_size']
+    overworld = Overworld([h, w], settings.game.chunk_size)
+    for payload in payloads:
+        overworld.add_chunk(payload)
+
+    return overworld
+
+
+def measure(func, payload):
+    """Return the time taken to load a payload and the memory used"""
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    overworld = func(payload)
+    load_time = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return load_time, memory
+
+
+def main():
+    print(
+        f'{"world":>10} {"load":>7} {"payload KB":>11} {"memory KB":>10} '
+        f'{"load ms":>9}'
+    )
+
+    for size in [(200, 100), (1000, 500), (2000, 1000)]:
+        world_json = world_payload(size)
+        chunks = chunk_payloads(world_json)
+
+        for name, func, payload in [
+            ('whole', Overworld.from_json_type, world_json),
+            ('chunks', load_chunks, chunks)
+        ]:
+            payload_size = len(json.dumps(payload))
+            load_time, memory = measure(func, payload)
+
+            print(
+                f'{size[0]:>4}x{size[1]:<5} {name:>7} '
+                f'{payload_size / 1024:>11.0f} {memory / 1024:>10.0f} '
+                f'{load_time * 1000:>9.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
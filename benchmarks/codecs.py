@@ -0,0 +1,59 @@
+"""
+Benchmark the wire codecs on typical large payloads, reporting encode/decode
+time and bytes on the wire.
+
+    python -m benchmarks.codecs
+"""
+
+import time
+
+from benchmarks.payloads import frames_payload, scene_payload, world_payload
+from game.clients.codecs import available_codecs, get_codec
+
+
+def bench(codec, payload, repeat):
+    """Return the encode time, decode time and encoded size for a payload"""
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        data = codec.encode(payload)
+    encode_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        codec.decode(data)
+    decode_time = (time.perf_counter() - start) / repeat
+
+    return encode_time, decode_time, len(data)
+
+
+def main():
+    repeat = 5
+
+    payloads = [
+        ('world:read', world_payload((500, 500))),
+        ('scene:read', scene_payload((200, 200))),
+        ('get_frames', frames_payload(1000, (500, 500)))
+    ]
+
+    print(
+        f'{"message":>12} {"codec":>8} {"encode ms":>10} {"decode ms":>10} '
+        f'{"bytes":>10}'
+    )
+
+    for message_type, payload in payloads:
+        for name in available_codecs():
+            encode_time, decode_time, size = bench(
+                get_codec(name),
+                payload,
+                repeat
+            )
+
+            print(
+                f'{message_type:>12} {name:>8} {encode_time * 1000:>10.1f} '
+                f'{decode_time * 1000:>10.1f} {size:>10}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark the time to render a frame (to an 80x24 terminal) as the party
+moves around overworlds of increasing size, rendering the whole overworld
+into the viewport versus only the tiles within the viewport (plus margin).
+
+    python -m benchmarks.culling
+"""
+
+import time
+
+from game.devserver.world import World, sprite_sheet_json_type
+from game.entities.overworld import Overworld
+from game.utils.colors import Colors
+from game.utils.headless import HeadlessWindow
+from game.utils.rendering import Viewport, get_bounds
+from game.utils.sprites import SpriteSheet
+
+
+# The terminal size rendered to
+SCREEN_SIZE = (24, 80)
+
+
+def per_frame(world_json, frames, positions, culled):
+    """Return the average time to apply and render a frame"""
+
+    overworld = Overworld.from_json_type(world_json)
+    viewport = Viewport()
+    window = HeadlessWindow(*SCREEN_SIZE)
+
+    max_y, max_x = SCREEN_SIZE
+    viewport_rect = [2, 1, max_y - 9, max_x - 3]
+
+    start = time.perf_counter()
+    for frame, yx in zip(frames, positions):
+        overworld.apply_scene_changes(frame['scene_changes'])
+
+        offset = overworld.get_offset(yx, [max_y - 8, max_x - 4])
+        if culled:
+            overworld.render_changes(
+                viewport,
+                get_bounds(offset, viewport_rect[2:])
+            )
+        else:
+            overworld.render(viewport)
+
+        viewport.render(window, viewport_rect[0:2], viewport_rect[2:], offset)
+
+    return (time.perf_counter() - start) / len(frames), window
+
+
+def main():
+    Colors.init(headless=True)
+    SpriteSheet.from_json_type(sprite_sheet_json_type())
+
+    print(f'{"world":>10} {"full ms":>10} {"culled ms":>10}')
+
+    for size in [(100, 50), (200, 100), (500, 250), (1000, 500)]:
+        world = World(size)
+
+        # Copy the tiles as the world continues to change them
+        world_json = {
+            'size': list(size),
+            'tiles': [list(t) for t in world.tiles]
+        }
+
+        positions = []
+        for i in range(30):
+            world.wander()
+            x, y = world.party_position
+            positions.append([y, x])
+        frames = [f for n, f in world.get_frames(0)]
+
+        full_time, a = per_frame(world_json, frames, positions, False)
+        culled_time, b = per_frame(world_json, frames, positions, True)
+
+        # Both must put the same characters on screen
+        assert a.grid == b.grid
+
+        print(
+            f'{size[0]:>4}x{size[1]:<5} {full_time * 1000:>10.2f} '
+            f'{culled_time * 1000:>10.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
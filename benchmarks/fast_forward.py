@@ -0,0 +1,144 @@
+"""
+Benchmark catching up on frames after a stall, applying (and rendering)
+every skipped frame versus compacting the skipped frames into one net diff,
+and decoding the skipped frames whole before compacting them versus
+compacting frames received with only their scene changes encoded.
+
+    python -m benchmarks.fast_forward
+"""
+
+import time
+
+from game.clients.codecs import available_codecs, get_codec
+from game.devserver.world import World, sprite_sheet_json_type
+from game.entities.overworld import Overworld
+from game.utils.colors import Colors
+from game.utils.frames import FrameStore, LazyFrame, compact_frames
+from game.utils.rendering import Viewport
+from game.utils.sprites import SpriteSheet
+
+
+def per_frame(world_json, frames):
+    """Apply and render each frame (the previous fast-forward)"""
+
+    overworld = Overworld.from_json_type(world_json)
+    viewport = Viewport()
+
+    start = time.perf_counter()
+    for frame in frames:
+        overworld.apply_scene_changes(frame['scene_changes'])
+        overworld.render(viewport)
+
+    return time.perf_counter() - start, overworld
+
+
+def compacted(world_json, frames):
+    """Apply the compacted frames and render once"""
+
+    overworld = Overworld.from_json_type(world_json)
+    viewport = Viewport()
+
+    start = time.perf_counter()
+    for frame in compact_frames(frames):
+        overworld.apply_scene_changes(frame['scene_changes'])
+    overworld.render(viewport)
+
+    return time.perf_counter() - start, overworld
+
+
+def decoded(codec, frames):
+    """Decode each (whole) frame then compact them (the previous decode)"""
+
+    store = FrameStore(len(frames))
+    for frame_no, frame in enumerate(frames):
+        store.add(frame_no, LazyFrame(codec.encode_nested(frame), codec))
+
+    start = time.perf_counter()
+    compact_frames([store.get(n) for n in range(len(frames))])
+
+    return time.perf_counter() - start
+
+
+def lazy(codec, frames):
+    """Compact frames received with only their scene changes encoded"""
+
+    store = FrameStore(len(frames))
+    for frame_no, frame in enumerate(frames):
+        frame = dict(
+            frame,
+            scene_changes=codec.encode_nested(frame['scene_changes'])
+        )
+        store.add(frame_no, LazyFrame(frame, codec))
+
+    start = time.perf_counter()
+    compact_frames([store.get_lazy(n) for n in range(len(frames))])
+
+    return time.perf_counter() - start
+
+
+def main():
+    Colors.init(headless=True)
+    SpriteSheet.from_json_type(sprite_sheet_json_type())
+
+    print(
+        f'{"world":>10} {"frames":>8} {"per frame ms":>14} '
+        f'{"compacted ms":>14}'
+    )
+
+    for size in [(100, 50), (200, 100)]:
+        for count in [10, 50, 200]:
+            world = World(size)
+
+            # Copy the tiles as the world continues to change them
+            world_json = {
+                'size': list(size),
+                'tiles': [list(t) for t in world.tiles]
+            }
+
+            for i in range(count):
+                world.wander()
+            frames = [f for n, f in world.get_frames(0)]
+
+            per_frame_time, a = per_frame(world_json, frames)
+            compacted_time, b = compacted(world_json, frames)
+
+            # Both approaches must arrive at the same overworld
+            assert all(
+                _layers(a.get_tile(i)) == _layers(b.get_tile(i))
+                for i in range(size[0] * size[1])
+            )
+
+            print(
+                f'{size[0]:>4}x{size[1]:<5} {count:>8} '
+                f'{per_frame_time * 1000:>14.1f} '
+                f'{compacted_time * 1000:>14.1f}'
+            )
+
+    print()
+    print(
+        f'{"codec":>10} {"frames":>8} {"decoded ms":>14} {"lazy ms":>14}'
+    )
+
+    world = World((200, 100))
+    for i in range(1000):
+        world.wander()
+    frames = [f for n, f in world.get_frames(0)]
+
+    for name in available_codecs():
+        codec = get_codec(name)
+        for count in [10, 50, 200, 1000]:
+            decoded_time = decoded(codec, frames[-count:])
+            lazy_time = lazy(codec, frames[-count:])
+
+            print(
+                f'{name:>10} {count:>8} '
+                f'{decoded_time * 1000:>14.2f} {lazy_time * 1000:>14.2f}'
+            )
+
+
+def _layers(tile):
+    return tile.biome, tile.landmark, tile.party
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark reading large length-prefixed frames (e.g a multi-megabyte
+`world:read` response) using the framing layer versus the previous approach
+of concatenating reads. Throughput is for reading frames only (decoding is
+benchmarked separately by `benchmarks.codecs`).
+
+    python -m benchmarks.framing
+"""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+
+from benchmarks.payloads import world_payload
+from game.clients import framing
+
+
+def legacy_read_frame(sock):
+    """
+    The read loop previously used by the clients (bounded to the frame so
+    that back-to-back frames can be read).
+    """
+
+    response_len = framing.HEADER.unpack(sock.recv(4))[0]
+    remaining = response_len
+
+    response = b''
+    while remaining > 0:
+        response += sock.recv(remaining // framing.LENGTH_SCALE)
+        remaining = response_len - len(response) * framing.LENGTH_SCALE
+
+    return response
+
+
+def read_frame(sock):
+    """
+    Read a frame from a (blocking) socket into a single buffer of the
+    announced size.
+    """
+
+    header = _recv_exactly(sock, bytearray(framing.HEADER.size))
+    return _recv_exactly(sock, bytearray(framing.payload_length(header)))
+
+
+def write_frame(sock, payload):
+    """Write a frame to a (blocking) socket"""
+    sock.sendall(framing.pack_frame(payload))
+    sock.sendall(payload)
+
+
+def bench_sync(read, payload, repeat):
+    """Return the time taken to read the payload `repeat` times"""
+
+    a, b = socket.socketpair()
+
+    def writer():
+        for i in range(repeat):
+            write_frame(a, payload)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        read(b)
+    elapsed = time.perf_counter() - start
+
+    thread.join()
+    a.close()
+    b.close()
+
+    return elapsed
+
+
+def bench_async(payload, repeat):
+    """Return the time taken to read the payload `repeat` times (asyncio)"""
+
+    async def run():
+        a, b = socket.socketpair()
+        reader, _ = await asyncio.open_connection(sock=b)
+
+        def writer():
+            for i in range(repeat):
+                write_frame(a, payload)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+
+        start = time.perf_counter()
+        for i in range(repeat):
+            await framing.read_frame_async(reader)
+        elapsed = time.perf_counter() - start
+
+        thread.join()
+        a.close()
+
+        return elapsed
+
+    return asyncio.run(run())
+
+
+def main():
+    repeat = 3
+
+    print(f'{"world":>12} {"payload":>10} {"reader":>8} {"MB/s":>10}')
+
+    for size in [(250, 250), (500, 500), (1000, 1000)]:
+        payload = json.dumps(world_payload(size)).encode()
+        mb = len(payload) * repeat / 1024 / 1024
+
+        results = [
+            ('legacy', bench_sync(legacy_read_frame, payload, repeat)),
+            ('sync', bench_sync(read_frame, payload, repeat)),
+            ('async', bench_async(payload, repeat))
+        ]
+
+        for name, elapsed in results:
+            print(
+                f'{size[0]:>5}x{size[1]:<6} '
+                f'{len(payload) / 1024 / 1024:>8.1f}MB '
+                f'{name:>8} {mb / elapsed:>10.1f}'
+            )
+
+
+def _recv_exactly(sock, buffer):
+    """Fill the given buffer from the socket"""
+
+    view = memoryview(buffer)
+    while view:
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError('Connection closed')
+
+        view = view[received:]
+
+    return buffer
+
+
+if __name__ == '__main__':
+    main()
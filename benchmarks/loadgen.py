@@ -0,0 +1,334 @@
+"""
+A headless load generator that runs many simulated players against a game
+server, each driving the same message sequence as the game client (join,
+fetch the overworld, then either lead the party or observe frames). With
+`--enter-scene` the party leader takes the party into a scene after the
+given number of seconds, players then move on their turn and end their turn
+(`player:end_turn`) once they're out of action points.
+
+Reports per-message latency percentiles, throughput and frame lag for each
+number of concurrent clients, stopping once frame lag exceeds the game's
+`max_frame_lag`:
+
+    python -m benchmarks.loadgen --clients 50,100,200,400 --duration 10
+
+Use `--devserver` to run against an in-process dev server (convenient, but
+the server then shares a process with the load, so for capacity numbers run
+`python -m game.devserver` separately).
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from game.clients.non_blocking import NonBlockingClient
+from game.devserver.server import DevServer
+from game.devserver.world import ACTION_POINTS
+from game.settings import settings
+
+
+class Stats:
+    """
+    Latency samples (by message type) and frame lag samples for a run.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.lags = []
+        self.errors = 0
+        self.elapsed = 0
+
+    @property
+    def requests(self):
+        return sum(len(s) for s in self.latencies.values())
+
+    def record(self, message_type, latency):
+        try:
+            self.latencies[message_type].append(latency)
+        except KeyError:
+            self.latencies[message_type] = [latency]
+
+
+def percentile(samples, p):
+    """Return the p-th percentile of the given samples"""
+
+    if not samples:
+        return 0
+
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+class SimulatedPlayer:
+    """
+    A headless player.
+    """
+
+    def __init__(self, node, args, stats):
+        self.args = args
+        self.stats = stats
+        self.client = NonBlockingClient(args.host, args.port, node)
+
+        # The last frame received by the player
+        self.frame_no = -1
+
+        # Whether the party is in a scene, the player whose turn it is and
+        # our remaining action points (tracked from the frames received).
+        self.in_scene = False
+        self.active_player = None
+        self.action_points = 0
+
+    async def send(self, message_type, message=None):
+        start = time.perf_counter()
+        response = await self.client.send(message_type, message)
+        self.stats.record(message_type, time.perf_counter() - start)
+        return response
+
+    @property
+    def is_my_turn(self):
+        return self.in_scene and self.active_player == self.client.node
+
+    def apply_frames(self, frames):
+        """Track the frame number and scene turns from received frames"""
+
+        for frame_no, frame in frames:
+            if frame_no <= self.frame_no:
+                continue
+
+            self.frame_no = frame_no
+
+            data = frame.get('data') or {}
+            if frame.get('action') == 'enter_scene':
+                self.in_scene = True
+
+            if 'active_player' in data:
+                self.active_player = data['active_player']
+
+                if data['active_player'] == self.client.node:
+                    self.action_points = data.get(
+                        'action_points',
+                        [ACTION_POINTS]
+                    )[0]
+
+    def on_frames(self, push):
+        self.apply_frames(push['frames'])
+
+    async def run(self, until):
+        """Play until the given time"""
+
+        await self.client.connect()
+        try:
+            await self.play(until)
+        finally:
+            await self.client.close()
+
+    async def play(self, until):
+        """Join the game and play (lead, take turns or observe)"""
+
+        # Join the game (registering a character if we need to)
+        response = await self.send('game:join')
+        if response.get('reason') == 'player_not_registered':
+            await self.send(
+                'player:create',
+                {'name': 'Bot', 'race': 'dwarf', 'profession': 'mage'}
+            )
+            response = await self.send('game:join')
+
+        # Fetch the overworld and party
+        await self.send('sprite_sheet:read')
+        world, party = (await self.send(
+            'batch',
+            [{'type': 'world:read'}, {'type': 'party:read'}]
+        ))['responses']
+        self.frame_no = (await self.send('peek'))['frame_no']
+
+        subscribed = False
+        if self.args.mode == 'subscribe':
+            self.client.add_push_listener('frames', self.on_frames)
+            response = await self.send(
+                'subscribe_frames',
+                {'frame_no': self.frame_no + 1}
+            )
+            subscribed = bool(response.get('subscribed'))
+
+        is_leader = party['leader'] == self.client.node
+        peek_interval = settings.game.peek_interval
+
+        enter_scene_at = None
+        if is_leader and self.args.enter_scene is not None:
+            enter_scene_at = time.time() + self.args.enter_scene
+
+        while time.time() < until:
+
+            if self.is_my_turn and self.args.move_rate:
+
+                # Take our turn, ending it once we're out of action points
+                if self.action_points > 0:
+                    await self.send(
+                        'move',
+                        {'direction': random.randrange(8)}
+                    )
+                else:
+                    await self.send('player:end_turn')
+
+                    # Wait for the frame passing the turn on
+                    self.active_player = None
+
+                await asyncio.sleep(1 / self.args.move_rate)
+                continue
+
+            if enter_scene_at and time.time() >= enter_scene_at:
+                enter_scene_at = None
+                await self.send('party:enter_scene')
+                continue
+
+            if is_leader and self.args.move_rate and not self.in_scene:
+                await self.send('move', {'direction': random.randrange(8)})
+                await asyncio.sleep(1 / self.args.move_rate)
+                continue
+
+            # Observe, sampling how far behind the server we are
+            server_frame_no = (await self.send('peek'))['frame_no']
+
+            if not subscribed and self.frame_no < server_frame_no:
+                frames = (await self.send(
+                    'get_frames',
+                    {'frame_no': self.frame_no + 1}
+                ))['frames']
+
+                self.apply_frames(frames)
+
+            self.stats.lags.append(max(0, server_frame_no - self.frame_no))
+
+            await asyncio.sleep(peek_interval * random.uniform(0.5, 1.5))
+
+
+async def run_level(clients, args):
+    """Run the given number of simulated players and return their stats"""
+
+    stats = Stats()
+    until = time.time() + args.ramp + args.duration
+
+    async def play(i):
+
+        # Stagger connections across the ramp up period
+        await asyncio.sleep(args.ramp * i / clients)
+
+        try:
+            await SimulatedPlayer(f'loadgen-{i}', args, stats).run(until)
+        except (ConnectionError, OSError, KeyError):
+            stats.errors += 1
+
+    start = time.time()
+    await asyncio.gather(*[play(i) for i in range(clients)])
+    stats.elapsed = time.time() - start
+
+    return stats
+
+
+def report(clients, stats):
+    """Print the stats for a run"""
+
+    max_frame_lag = settings.game.max_frame_lag
+    lag_p99 = percentile(stats.lags, 99)
+    over = sum(1 for lag in stats.lags if lag > max_frame_lag)
+
+    print(
+        f'\n{clients} clients: {stats.requests / stats.elapsed:.0f} req/s, '
+        f'{stats.errors} errors, frame lag p50 '
+        f'{percentile(stats.lags, 50)} p99 {lag_p99} '
+        f'({over} of {len(stats.lags)} samples over {max_frame_lag})'
+    )
+
+    print(
+        f'  {"message":<18} {"count":>8} {"p50 ms":>8} {"p90 ms":>8} '
+        f'{"p99 ms":>8}'
+    )
+
+    for message_type, samples in sorted(stats.latencies.items()):
+        print(
+            f'  {message_type:<18} {len(samples):>8} '
+            f'{percentile(samples, 50) * 1000:>8.1f} '
+            f'{percentile(samples, 90) * 1000:>8.1f} '
+            f'{percentile(samples, 99) * 1000:>8.1f}'
+        )
+
+    return lag_p99 > max_frame_lag
+
+
+async def main(args):
+
+    server = None
+    if args.devserver:
+        server = DevServer(
+            size=args.size,
+            frame_rate=args.frame_rate,
+
+            # A client must lead the party to take it into a scene
+            autopilot=args.enter_scene is None
+        )
+        await server.start(args.host, args.port)
+        args.port = server.port
+
+    try:
+        for clients in args.clients:
+            stats = await run_level(clients, args)
+            if report(clients, stats):
+                print(f'\nFrame lag exceeded max_frame_lag at {clients} clients')
+                break
+
+    finally:
+        if server:
+            await server.stop()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Generate load on a server.')
+    parser.add_argument('--host', default=settings.server.host)
+    parser.add_argument('--port', type=int, default=settings.server.port)
+    parser.add_argument(
+        '--clients',
+        type=lambda v: [int(c) for c in v.split(',')],
+        default=[10, 50, 100],
+        help='Comma separated numbers of concurrent clients to step through'
+    )
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--ramp', type=float, default=2)
+    parser.add_argument(
+        '--mode',
+        choices=['peek', 'subscribe'],
+        default='subscribe',
+        help='How observers receive frames'
+    )
+    parser.add_argument(
+        '--move-rate',
+        type=float,
+        default=2,
+        help='Moves per second made by a client leading the party'
+    )
+    parser.add_argument(
+        '--enter-scene',
+        type=float,
+        default=None,
+        help='Seconds after which the party leader enters a scene'
+    )
+    parser.add_argument(
+        '--devserver',
+        action='store_true',
+        help='Run against an in-process dev server (on a random port)'
+    )
+    parser.add_argument(
+        '--size',
+        type=lambda v: tuple(int(d) for d in v.lower().split('x')),
+        default=(200, 100)
+    )
+    parser.add_argument('--frame-rate', type=float, default=10)
+
+    args = parser.parse_args()
+    if args.devserver:
+        args.host = '127.0.0.1'
+        args.port = 0
+
+    asyncio.run(main(args))
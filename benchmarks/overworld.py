@@ -0,0 +1,110 @@
+"""
+Benchmark the memory used by, and time taken to load and apply frames to,
+the overworld storing its tiles as arrays of sprite ids versus an object
+per tile (the previous model, reproduced here for comparison).
+
+    python -m benchmarks.overworld
+"""
+
+import time
+import tracemalloc
+
+from benchmarks.payloads import world_payload
+from game.devserver.world import World
+from game.entities.overworld import Overworld
+
+
+class ObjectOverworld:
+    """The previous overworld model, an `ObjectTile` per tile"""
+
+    def __init__(self, size):
+        self._size = size
+        self._tiles = [ObjectTile() for i in range(size[0] * size[1])]
+
+    def apply_scene_changes(self, scene_changes):
+        for tile_index, sprites in scene_changes.items():
+            biome, landmark, party = sprites
+
+            tile = self._tiles[int(tile_index)]
+            tile.biome = None if biome == -1 else tuple(biome)
+            tile.landmark = None if landmark == -1 else tuple(landmark)
+            tile.party = None if party == -1 else tuple(party)
+
+    @classmethod
+    def from_json_type(cls, json_type):
+        size = [json_type['size'][1], json_type['size'][0]]
+        tiles = json_type['tiles']
+
+        overworld = cls(size)
+        for tile_index, sprites in enumerate(tiles):
+            biome, landmark, party = sprites
+            tile = overworld._tiles[tile_index]
+
+            if biome != -1:
+                tile.biome = tuple(biome)
+
+            if landmark != -1:
+                tile.landmark = tuple(landmark)
+
+            if party != -1:
+                tile.party = tuple(party)
+
+        return overworld
+
+
+class ObjectTile:
+
+    def __init__(self, biome=None, landmark=None, party=None):
+        self.landmark = landmark
+        self.biome = biome
+        self.party = party
+
+
+def load(cls, world_json):
+    """Return the time taken to load an overworld and the memory it uses"""
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    overworld = cls.from_json_type(world_json)
+    load_time = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return overworld, load_time, memory
+
+
+def apply(overworld, frames):
+    """Return the time taken to apply a set of frames to an overworld"""
+
+    start = time.perf_counter()
+    for frame in frames:
+        overworld.apply_scene_changes(frame['scene_changes'])
+    return time.perf_counter() - start
+
+
+def main():
+    print(
+        f'{"world":>10} {"model":>7} {"memory KB":>10} {"load ms":>9} '
+        f'{"apply ms":>9}'
+    )
+
+    for size in [(200, 100), (500, 250), (1000, 500)]:
+        world_json = world_payload(size)
+
+        world = World((100, 50))
+        for i in range(500):
+            world.wander()
+        frames = [f for n, f in world.get_frames(0)]
+
+        for name, cls in [('objects', ObjectOverworld), ('arrays', Overworld)]:
+            overworld, load_time, memory = load(cls, world_json)
+            apply_time = apply(overworld, frames)
+
+            print(
+                f'{size[0]:>4}x{size[1]:<5} {name:>7} {memory / 1024:>10.0f} '
+                f'{load_time * 1000:>9.1f} {apply_time * 1000:>9.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
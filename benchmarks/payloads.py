@@ -0,0 +1,93 @@
+"""
+Synthetic server payloads (`world:read`, `scene:read`, `get_frames`) shaped
+like those sent by the game server, for use by the benchmarks.
+"""
+
+import random
+
+__all__ = [
+    'frames_payload',
+    'scene_payload',
+    'world_payload'
+]
+
+
+# Sprite paths used to populate generated tiles
+BIOMES = [[1], [2], [3], [4], [5, 1], [5, 2], [5, 2, 1]]
+CREATURES = [[1], [2], [3]]
+ITEMS = [[1, 0, 0]]
+LANDMARKS = [[1]]
+SCENARY = [[1], [2]]
+TERRAIN = [[1], [2], [3], [3, 1]]
+
+
+def world_payload(size, seed=0):
+    """
+    Return a `world:read` payload for a world of the given size (width,
+    height). Biomes are laid out in long runs as they are in real worlds.
+    """
+
+    rand = random.Random(seed)
+    w, h = size
+
+    tiles = []
+    biome = rand.choice(BIOMES)
+    for i in range(w * h):
+
+        if rand.random() < 0.05:
+            biome = rand.choice(BIOMES)
+
+        landmark = rand.choice(LANDMARKS) if rand.random() < 0.002 else -1
+        tiles.append([biome, landmark, -1])
+
+    return {'size': [w, h], 'tiles': tiles}
+
+
+def scene_payload(size, seed=0):
+    """Return a `scene:read` payload for a scene of the given size"""
+
+    rand = random.Random(seed)
+    w, h = size
+
+    tiles = []
+    for i in range(w * h):
+        tiles.append([
+            rand.choice(TERRAIN),
+            rand.choice(SCENARY) if rand.random() < 0.3 else -1,
+            rand.choice(ITEMS) if rand.random() < 0.01 else -1,
+            rand.choice(CREATURES) if rand.random() < 0.01 else -1
+        ])
+
+    return {'size': [w, h], 'tiles': tiles}
+
+
+def frames_payload(count, size, first_frame_no=0, seed=0):
+    """
+    Return a `get_frames` payload containing the given number of party move
+    frames within a world of the given size.
+    """
+
+    rand = random.Random(seed)
+    w, h = size
+
+    frames = []
+    x, y = w // 2, h // 2
+    for frame_no in range(first_frame_no, first_frame_no + count):
+        from_index = y * w + x
+        x = max(0, min(w - 1, x + rand.choice([-1, 0, 1])))
+        y = max(0, min(h - 1, y + rand.choice([-1, 0, 1])))
+
+        frames.append([
+            frame_no,
+            {
+                'actor': 'party',
+                'action': 'move',
+                'data': {'position': [x, y]},
+                'scene_changes': {
+                    str(from_index): [[1], -1, -1],
+                    str(y * w + x): [[1], -1, [1]]
+                }
+            }
+        ])
+
+    return {'frames': frames}
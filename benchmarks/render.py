@@ -0,0 +1,121 @@
+"""
+Benchmark full-world renders of the overworld resolving each tile's sprite
+as it's rendered (the previous render) versus reading each tile's glyph
+resolved when the tile was set, and the steady state cost of a frame (a
+party move) rendering the whole overworld versus only the tiles changed.
+
+    python -m benchmarks.render
+"""
+
+import curses
+import time
+
+from benchmarks.payloads import world_payload
+from game.devserver.world import World, sprite_sheet_json_type
+from game.entities.overworld import Overworld
+from game.utils.colors import Colors
+from game.utils.rendering import Viewport
+from game.utils.sprites import SpriteSheet
+
+
+def resolved(overworld, viewport):
+    """Render resolving each tile's sprite (the previous render)"""
+
+    h, w = overworld.size
+    for y in range(h):
+        for x in range(w):
+            tile = overworld.get_tile(y, x)
+            if tile.character:
+                viewport.blit(
+                    y,
+                    x,
+                    0,
+                    tile.character,
+                    tile.color_pair | curses.A_BOLD
+                )
+
+
+def cached(overworld, viewport):
+    """Render from the glyph cache"""
+    overworld.render(viewport)
+
+
+def timed(render, overworld, renders):
+    """Return the average time for a render and the viewport rendered to"""
+
+    viewport = Viewport()
+
+    start = time.perf_counter()
+    for i in range(renders):
+        render(overworld, viewport)
+
+    return (time.perf_counter() - start) / renders, viewport
+
+
+def per_frame(render, world_json, frames):
+    """Return the average time to apply and render a frame"""
+
+    overworld = Overworld.from_json_type(world_json)
+    viewport = Viewport()
+    overworld.render(viewport)
+
+    start = time.perf_counter()
+    for frame in frames:
+        overworld.apply_scene_changes(frame['scene_changes'])
+        render(overworld, viewport)
+
+    return (time.perf_counter() - start) / len(frames), viewport
+
+
+def main():
+    Colors.init(headless=True)
+    SpriteSheet.from_json_type(sprite_sheet_json_type())
+
+    print(f'{"world":>10} {"resolved ms":>12} {"cached ms":>10}')
+
+    for size in [(100, 50), (200, 100), (500, 250)]:
+        overworld = Overworld.from_json_type(world_payload(size))
+
+        resolved_time, a = timed(resolved, overworld, 3)
+        cached_time, b = timed(cached, overworld, 3)
+
+        # Both renders must produce the same output
+        assert a.buffers == b.buffers
+
+        print(
+            f'{size[0]:>4}x{size[1]:<5} {resolved_time * 1000:>12.1f} '
+            f'{cached_time * 1000:>10.1f}'
+        )
+
+    print(f'\n{"world":>10} {"full ms":>10} {"changes ms":>11}')
+
+    for size in [(100, 50), (200, 100), (500, 250)]:
+        world = World(size)
+
+        # Copy the tiles as the world continues to change them
+        world_json = {
+            'size': list(size),
+            'tiles': [list(t) for t in world.tiles]
+        }
+
+        for i in range(50):
+            world.wander()
+        frames = [f for n, f in world.get_frames(0)]
+
+        full_time, a = per_frame(cached, world_json, frames)
+        changes_time, b = per_frame(
+            lambda o, v: o.render_changes(v),
+            world_json,
+            frames
+        )
+
+        assert a.buffers == b.buffers
+
+        print(
+            f'{size[0]:>4}x{size[1]:<5} {full_time * 1000:>10.2f} '
+            f'{changes_time * 1000:>11.3f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
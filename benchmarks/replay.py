@@ -0,0 +1,67 @@
+"""
+Simulate a passive observer catching up on a backlog of frames with the
+replay scheduler, reporting how long (in game time) catching up takes and
+the worst lag seen while the server continues to produce frames.
+
+    python -m benchmarks.replay
+"""
+
+from game.settings import settings
+from game.utils.replay import ReplayScheduler, simulate_catch_up
+
+
+def simulate(backlog, server_frame_rate, loop_dt, max_speed, limit=120):
+    """
+    Return the time taken to catch up on a backlog of frames (or None if
+    the observer doesn't catch up within the limit) and the max lag seen.
+    """
+
+    scheduler = ReplayScheduler(
+        settings.game.replay_frame_rate,
+        settings.game.max_frame_lag,
+        max_speed
+    )
+
+    return simulate_catch_up(
+        scheduler,
+        backlog,
+        server_frame_rate,
+        loop_dt,
+        limit
+    )
+
+
+def main():
+    max_frame_lag = settings.game.max_frame_lag
+    max_speed = settings.game.replay_max_speed
+
+    print(
+        f'{"backlog":>8} {"server fps":>11} {"loop dt":>8} '
+        f'{"1x catch up":>12} {f"{max_speed}x catch up":>12} {"max lag":>8}'
+    )
+
+    for server_frame_rate in [10, 25]:
+        for loop_dt in [0.1, 0.016]:
+            for backlog in [1, max_frame_lag // 2, max_frame_lag]:
+
+                fixed, _ = simulate(backlog, server_frame_rate, loop_dt, 1)
+                adaptive, max_lag = simulate(
+                    backlog,
+                    server_frame_rate,
+                    loop_dt,
+                    max_speed
+                )
+
+                print(
+                    f'{backlog:>8} {server_frame_rate:>11} {loop_dt:>8} '
+                    f'{_format(fixed):>12} {_format(adaptive):>12} '
+                    f'{max_lag:>8}'
+                )
+
+
+def _format(t):
+    return 'never' if t is None else f'{t:.2f}s'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark the memory used by, and time taken to load, scenes storing their
+tiles as layered arrays versus an object per tile (the previous model,
+reproduced here for comparison).
+
+    python -m benchmarks.scene
+"""
+
+from benchmarks.overworld import load
+from benchmarks.payloads import scene_payload
+from game.entities.scene import Scene
+
+
+class ObjectScene:
+    """The previous scene model, an `ObjectTile` per tile"""
+
+    def __init__(self, size):
+        self._size = size
+        self._tiles = [ObjectTile() for i in range(size[0] * size[1])]
+
+    @classmethod
+    def from_json_type(cls, json_type):
+        size = [json_type['size'][1], json_type['size'][0]]
+        tiles = json_type['tiles']
+
+        scene = cls(size)
+        for tile_index, sprites in enumerate(tiles):
+            terrain, scenary, items, creatures = sprites
+            tile = scene._tiles[tile_index]
+
+            if terrain != -1:
+                tile.terrain = tuple(terrain)
+
+            if scenary != -1:
+                tile.scenary = tuple(scenary)
+
+            if items != -1:
+                tile.items = tuple(items)
+
+            if creatures != -1:
+                tile.creatures = tuple(creatures)
+
+        return scene
+
+
+class ObjectTile:
+
+    def __init__(self, terrain=None, scenary=None, items=None, creatures=None):
+        self.terrain = terrain
+        self.scenary = scenary
+        self.items = items
+        self.creatures = creatures
+
+
+def main():
+    print(f'{"scene":>10} {"model":>7} {"memory KB":>10} {"load ms":>9}')
+
+    for size in [(60, 30), (250, 250), (1000, 1000)]:
+        scene_json = scene_payload(size)
+
+        for name, cls in [('objects', ObjectScene), ('arrays', Scene)]:
+            scene, load_time, memory = load(cls, scene_json)
+
+            print(
+                f'{size[0]:>4}x{size[1]:<5} {name:>7} {memory / 1024:>10.0f} '
+                f'{load_time * 1000:>9.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,10 @@
 
-import json
+import asyncio
+import concurrent.futures
 import logging
-import socket
-import struct
-import uuid
+import threading
 
-from game.settings import settings
-from game.utils.player import get_player_uid
+from game.clients.non_blocking import NonBlockingClient
 
 
 class BlockingClient:
@@ -14,54 +12,120 @@ class BlockingClient:
     The `BlockingClient` provides an interface for connecting to and
     communicating with the game server that blocks the game loop when making a
     request to wait for a response.
+
+    The blocking client doesn't hold a connection of its own, it's a thin
+    facade over a `NonBlockingClient` that runs on a dedicated IO thread. Calls
+    are submitted to the non-blocking client and waited on, so blocking calls
+    (e.g `game:join`) and non-blocking calls (e.g `peek`) share one connection
+    to the server.
     """
 
-    def __init__(self):
-        self._socket = None
-        self._connected = False
+    def __init__(self, client=None):
+        self._client = client or NonBlockingClient()
+
+        # The event loop (and thread running it) that the non-blocking client
+        # performs IO on.
+        self._loop = None
+        self._thread = None
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def compression(self):
+        return self._client.compression
 
     @property
     def connected(self):
-        return self._connected
+        return self._client.connected
 
-    def connect(self):
-        """Connect to the game server"""
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._socket.connect((settings.server.host, settings.server.port))
-
-        # Register
-        r = self.send(
-            'handshake',
-            {
-                'node': get_player_uid(),
-                'password': settings.server.password
-            }
-        )
+    @property
+    def reconnecting(self):
+        return self._client.reconnecting
+
+    @property
+    def stats(self):
+        return self._client.stats
+
+    def close(self):
+        """Close the connection to the game server and stop the IO thread"""
+
+        if not self._loop:
+            return
 
-        self._connected = True
+        self.call(self._client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
 
-    def send(self, message_type, message=None):
-        """Send a message to the game server"""
+        self._loop = None
+        self._thread = None
 
-        # Build the message to send
-        json_data = json.dumps({
-            'uid': str(uuid.uuid4()),
-            'type': message_type,
-            'message': message
-        }).encode('utf8')
+    def connect(self):
+        """Connect to the game server"""
+
+        if not self._loop:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._run_loop,
+                name='client-io',
+                daemon=True
+            )
+            self._thread.start()
+
+        self.call(self._client.connect())
+
+    def batch(self, commands):
+        """
+        Send several messages to the game server in a single request (see
+        `NonBlockingClient.batch`).
+        """
+        return self.call(self._client.batch(commands))
+
+    def call(self, coroutine):
+        """
+        Run a coroutine against the non-blocking client on the IO thread and
+        wait for the result.
+        """
+        return self.submit_coroutine(coroutine).result()
+
+    def send(self, message_type, message=None, timeout=None):
+        """
+        Send a message to the game server, if a timeout (in seconds) is given
+        and no response is received in time `TimeoutError` is raised.
+        """
+        future = self.submit(message_type, message)
+
+        try:
+            return future.result(timeout)
+
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f'No response to {message_type}')
+
+    def submit(self, message_type, message=None):
+        """
+        Send a message to the game server without waiting for the response,
+        a `concurrent.futures.Future` for the response is returned (use
+        `asyncio.wrap_future` to await it from the game loop).
+        """
+        return self.submit_coroutine(
+            self._client.send(message_type, message)
+        )
 
-        return self._send(json_data)
+    def submit_coroutine(self, coroutine):
+        """Schedule a coroutine to run on the IO thread"""
+        assert self._loop, 'Client used before connecting.'
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
 
-    def _send(self, json_data):
-        self._socket.sendall(struct.pack('>I', len(json_data) * 4))
-        self._socket.sendall(json_data)
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
 
-        response_len = struct.unpack('>I', self._socket.recv(4))[0]
-        remaining = response_len
+        try:
+            self._loop.run_forever()
 
-        response = b''
-        while remaining > 0:
-            response += self._socket.recv(remaining)
-            remaining = response_len - len(response) * 4
+        except Exception:
+            logging.exception('Client IO thread failed')
 
-        return json.loads(response.decode('utf8') or '{}')
+        finally:
+            self._loop.close()
@@ -0,0 +1,96 @@
+"""
+The codecs module provides the wire codecs used to encode/decode messages
+sent between the clients and the game server.
+
+JSON is always available and is used until a codec is negotiated with the
+server during the `handshake` message. The compact binary `msgpack` codec is
+available if the `msgpack` package is installed.
+"""
+
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+__all__ = [
+    'DEFAULT_CODEC',
+    'JSONCodec',
+    'MsgpackCodec',
+    'available_codecs',
+    'get_codec'
+]
+
+
+class JSONCodec:
+    """
+    Encode/decode messages as JSON (the default).
+    """
+
+    name = 'json'
+
+    def decode(self, data):
+        return json.loads(data or b'{}')
+
+    def encode(self, obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf8')
+
+    def encode_nested(self, obj):
+        """
+        Encode an object to be embedded (still encoded) within a message, e.g
+        frames sent to be decoded only when needed.
+        """
+        return json.dumps(obj, separators=(',', ':'))
+
+
+class MsgpackCodec:
+    """
+    Encode/decode messages as msgpack, a compact binary encoding that avoids
+    the cost of formatting/parsing numbers as text (which makes up most of a
+    tile array).
+    """
+
+    name = 'msgpack'
+
+    def decode(self, data):
+        if not data:
+            return {}
+
+        # Scene changes are keyed by tile index which msgpack (unlike JSON)
+        # can send as integers.
+        return msgpack.unpackb(data, strict_map_key=False)
+
+    def encode(self, obj):
+        return msgpack.packb(obj)
+
+    def encode_nested(self, obj):
+        """
+        Encode an object to be embedded (still encoded) within a message, e.g
+        frames sent to be decoded only when needed.
+        """
+        return msgpack.packb(obj)
+
+
+# A table of supported codecs by name
+_codecs = {
+    JSONCodec.name: JSONCodec,
+    MsgpackCodec.name: MsgpackCodec
+}
+
+# The codec used until another is negotiated
+DEFAULT_CODEC = JSONCodec.name
+
+
+def available_codecs():
+    """Return the names of the codecs that can be used by this client"""
+    names = [JSONCodec.name]
+    if msgpack:
+        names.append(MsgpackCodec.name)
+    return names
+
+
+def get_codec(name):
+    """Return an instance of the named codec"""
+    assert name in available_codecs(), f'Codec not available: {name}'
+    return _codecs[name]()
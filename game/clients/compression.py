@@ -0,0 +1,170 @@
+"""
+The compression module provides optional per-message compression of the
+payloads sent between the clients and the game server.
+
+Compression is negotiated during the `handshake` message, once negotiated
+every payload is prefixed with a single byte identifying how the rest of the
+payload is compressed (if at all). Small payloads are sent uncompressed so
+they don't pay the CPU cost, larger payloads are compressed with a method and
+level chosen by their size.
+"""
+
+import lzma
+import time
+import zlib
+
+from game.settings import settings
+
+__all__ = [
+    'Compression',
+    'CompressionStats',
+    'available_methods'
+]
+
+
+# Flags prefixed to each payload once compression has been negotiated
+RAW = 0
+ZLIB = 1
+LZMA = 2
+
+_method_flags = {
+    'zlib': ZLIB,
+    'lzma': LZMA
+}
+
+
+def available_methods():
+    """Return the names of the compression methods supported"""
+    return list(_method_flags.keys())
+
+
+class CompressionStats:
+    """
+    Running totals for the payloads compressed/decompressed.
+    """
+
+    def __init__(self):
+        self.compressed = 0
+        self.compress_time = 0
+        self.decompressed = 0
+        self.decompress_time = 0
+
+        # Total bytes before (raw) and after (wire) compression
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+
+    @property
+    def ratio(self):
+        if not self.wire_bytes:
+            return 1
+        return self.raw_bytes / self.wire_bytes
+
+    def summary(self):
+        """Return a one line summary of the stats"""
+        return (
+            f'ratio={self.ratio:.2f} '
+            f'comp={self.compressed}/{self.compress_time * 1000:.1f}ms '
+            f'decomp={self.decompressed}/{self.decompress_time * 1000:.1f}ms'
+        )
+
+
+class Compression:
+    """
+    Compress/decompress payloads using the negotiated methods. If no methods
+    were negotiated payloads are passed through untouched (with no flag).
+
+    Stats are recorded against the given `CompressionStats` (if any) so that
+    they can outlive the compression negotiated for a single connection.
+    """
+
+    def __init__(self, methods=None, stats=None):
+        self._methods = [m for m in methods or [] if m in _method_flags]
+        self._stats = stats or CompressionStats()
+
+    @property
+    def enabled(self):
+        return bool(self._methods)
+
+    @property
+    def methods(self):
+        return list(self._methods)
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def compress(self, data):
+        """Return the payload to send for the given data"""
+
+        if not self._methods:
+            return data
+
+        flag, level = self._choose(len(data))
+
+        if flag == RAW:
+            return bytes([RAW]) + data
+
+        start = time.thread_time()
+
+        if flag == LZMA:
+            compressed = lzma.compress(data, preset=level)
+        else:
+            compressed = zlib.compress(data, level)
+
+        self._stats.compressed += 1
+        self._stats.compress_time += time.thread_time() - start
+        self._stats.raw_bytes += len(data)
+        self._stats.wire_bytes += len(compressed) + 1
+
+        return bytes([flag]) + compressed
+
+    def decompress(self, payload):
+        """Return the data for the given payload"""
+
+        if not self._methods or not payload:
+            return payload
+
+        flag = payload[0]
+
+        if flag == RAW:
+            return payload[1:]
+
+        data = memoryview(payload)[1:]
+
+        start = time.thread_time()
+
+        if flag == LZMA:
+            decompressed = lzma.decompress(data)
+        elif flag == ZLIB:
+            decompressed = zlib.decompress(data)
+        else:
+            raise ValueError(f'Unknown compression flag: {flag}')
+
+        self._stats.decompressed += 1
+        self._stats.decompress_time += time.thread_time() - start
+        self._stats.raw_bytes += len(decompressed)
+        self._stats.wire_bytes += len(payload)
+
+        return decompressed
+
+    def _choose(self, size):
+        """Return the compression flag and level to use for a payload size"""
+
+        cfg = settings.server
+
+        if size < cfg.compression_threshold:
+            return RAW, 0
+
+        if 'lzma' in self._methods and size >= cfg.compression_lzma_threshold:
+            return LZMA, 1
+
+        if 'zlib' in self._methods:
+
+            # Favour speed for mid-sized payloads, for large payloads the
+            # bandwidth saved outweighs the extra CPU time.
+            if size >= cfg.compression_lzma_threshold:
+                return ZLIB, 6
+            return ZLIB, 1
+
+        # Only lzma is available, which isn't worth it below its threshold
+        return RAW, 0
@@ -0,0 +1,49 @@
+"""
+The framing module provides the length-prefixed framing used for messages
+sent between the clients and the game server.
+
+Each frame is a 4 byte big-endian length followed by the payload, the length
+announced is the payload's byte length multiplied by `LENGTH_SCALE` (a quirk
+of the server protocol). Payloads are read into a single buffer of the
+announced size rather than being built up by concatenating reads.
+"""
+
+import struct
+
+__all__ = [
+    'HEADER',
+    'LENGTH_SCALE',
+    'pack_frame',
+    'payload_length',
+    'read_frame_async',
+    'write_frame_async'
+]
+
+
+# The struct used to pack/unpack the length prefix of a frame
+HEADER = struct.Struct('>I')
+
+# The multiplier applied to the payload length announced in the header
+LENGTH_SCALE = 4
+
+
+def pack_frame(payload):
+    """Return the header for the given payload"""
+    return HEADER.pack(len(payload) * LENGTH_SCALE)
+
+
+def payload_length(header):
+    """Return the length in bytes of the payload announced by a header"""
+    return -(-HEADER.unpack(header)[0] // LENGTH_SCALE)
+
+
+async def read_frame_async(reader):
+    """Read a frame from an `asyncio.StreamReader` returning the payload"""
+    header = await reader.readexactly(HEADER.size)
+    return await reader.readexactly(payload_length(header))
+
+
+def write_frame_async(writer, payload):
+    """Write a frame to an `asyncio.StreamWriter`"""
+    writer.write(pack_frame(payload))
+    writer.write(payload)
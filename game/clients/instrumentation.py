@@ -0,0 +1,329 @@
+"""
+The instrumentation module records statistics about the messages sent
+between the clients and the game server, per message type:
+
+- round trip times (as a histogram),
+- request and response sizes (on the wire),
+- encode and decode times,
+- compression ratios and compress/decompress (CPU) times,
+- the number of requests in flight.
+
+Every client keeps an `Instrumentation` instance (`client.stats`), e.g:
+
+    for message_type, stats in client.stats.snapshot().items():
+        print(message_type, stats.rtt.percentile(99), stats.in_flight)
+
+"""
+
+import threading
+import time
+
+__all__ = [
+    'Histogram',
+    'Instrumentation',
+    'MessageStats'
+]
+
+
+# The upper bound (in seconds) of each histogram bucket, buckets double in
+# size from 0.25ms to ~16s (samples above this fall in a final bucket).
+BUCKET_BOUNDS = [0.00025 * 2 ** i for i in range(17)]
+
+
+class Histogram:
+    """
+    A histogram of durations using logarithmic buckets, cheap enough to record
+    every request and precise enough (within a factor of two) to spot lag.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @property
+    def mean(self):
+        if not self.count:
+            return 0
+        return self.total / self.count
+
+    def add(self, value):
+        """Add a sample to the histogram"""
+
+        i = 0
+        while i < len(BUCKET_BOUNDS) and value > BUCKET_BOUNDS[i]:
+            i += 1
+
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def copy(self):
+        histogram = Histogram()
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.total = self.total
+        histogram.max = self.max
+        return histogram
+
+    def percentile(self, p):
+        """
+        Return an estimate of the p-th percentile (the upper bound of the
+        bucket it falls in, or the max sample if lower).
+        """
+
+        if not self.count:
+            return 0
+
+        target = self.count * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                if i < len(BUCKET_BOUNDS):
+                    return min(BUCKET_BOUNDS[i], self.max)
+                break
+
+        return self.max
+
+
+class MessageStats:
+    """
+    Statistics for a single message type.
+    """
+
+    def __init__(self, message_type):
+        self.message_type = message_type
+
+        # The number of requests sent/answered/failed and currently waiting
+        # for a response.
+        self.sent = 0
+        self.received = 0
+        self.failed = 0
+        self.in_flight = 0
+
+        # Total bytes sent/received (after compression)
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+        # Total time spent encoding/decoding messages (in seconds)
+        self.encode_time = 0
+        self.decode_time = 0
+
+        # Total bytes sent/received before compression, and the CPU time
+        # spent compressing/decompressing them (in seconds).
+        self.request_raw_bytes = 0
+        self.response_raw_bytes = 0
+        self.compress_time = 0
+        self.decompress_time = 0
+
+        # Round trip times (from sending a request to decoding its response)
+        self.rtt = Histogram()
+
+    @property
+    def compression_ratio(self):
+        wire_bytes = self.request_bytes + self.response_bytes
+        if not wire_bytes:
+            return 1
+        return (self.request_raw_bytes + self.response_raw_bytes) / wire_bytes
+
+    @property
+    def mean_compress_time(self):
+        if not self.sent:
+            return 0
+        return self.compress_time / self.sent
+
+    @property
+    def mean_decode_time(self):
+        if not self.received:
+            return 0
+        return self.decode_time / self.received
+
+    @property
+    def mean_decompress_time(self):
+        if not self.received:
+            return 0
+        return self.decompress_time / self.received
+
+    @property
+    def mean_encode_time(self):
+        if not self.sent:
+            return 0
+        return self.encode_time / self.sent
+
+    @property
+    def mean_request_bytes(self):
+        if not self.sent:
+            return 0
+        return self.request_bytes / self.sent
+
+    @property
+    def mean_response_bytes(self):
+        if not self.received:
+            return 0
+        return self.response_bytes / self.received
+
+    def copy(self):
+        stats = MessageStats(self.message_type)
+        stats.__dict__.update(self.__dict__)
+        stats.rtt = self.rtt.copy()
+        return stats
+
+    def summary(self):
+        """Return a one line summary of the stats"""
+
+        parts = [f'n={self.received}']
+
+        # Pushed messages have no round trip or request
+        if self.sent:
+            parts += [
+                f'p50={self.rtt.percentile(50) * 1000:.1f}ms',
+                f'p99={self.rtt.percentile(99) * 1000:.1f}ms',
+                f'flight={self.in_flight}',
+                f'req={self.mean_request_bytes:.0f}B'
+            ]
+
+        parts.append(f'resp={self.mean_response_bytes:.0f}B')
+
+        if self.sent:
+            parts.append(f'enc={self.mean_encode_time * 1000:.2f}ms')
+
+        parts.append(f'dec={self.mean_decode_time * 1000:.2f}ms')
+
+        # Only shown for messages that compression has made smaller
+        if self.compression_ratio > 1:
+            parts += [
+                f'ratio={self.compression_ratio:.1f}',
+                f'zip={self.mean_compress_time * 1000:.2f}'
+                f'/{self.mean_decompress_time * 1000:.2f}ms'
+            ]
+
+        return ' '.join(parts)
+
+
+class Instrumentation:
+    """
+    Records statistics for the messages sent/received by a client. Messages
+    pushed by the server are recorded under `push:<push type>`.
+
+    Stats are recorded on the client's IO thread, use `snapshot` to read them
+    from another thread (e.g the game loop).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        # A table of stats (by message type)
+        self._stats = {}
+
+        # A table of requests waiting for a response (by uid) as
+        # (message type, time sent).
+        self._requests = {}
+
+    def get(self, message_type):
+        """Return a copy of the stats for the given message type"""
+        with self._lock:
+            stats = self._stats.get(message_type)
+            return stats.copy() if stats else MessageStats(message_type)
+
+    def reset(self):
+        """Reset all stats (requests in flight are still tracked)"""
+        with self._lock:
+            in_flight = {}
+            for message_type, sent in self._requests.values():
+                in_flight[message_type] = in_flight.get(message_type, 0) + 1
+
+            self._stats = {}
+            for message_type, count in in_flight.items():
+                self._get(message_type).in_flight = count
+
+    def snapshot(self):
+        """Return a copy of the stats for every message type"""
+        with self._lock:
+            return {t: s.copy() for t, s in self._stats.items()}
+
+    # Recording
+
+    def request_sent(
+        self,
+        uid,
+        message_type,
+        size,
+        encode_time,
+        raw_size=None,
+        compress_time=0
+    ):
+        """
+        Record a request being sent, `raw_size` is the size of the request
+        before compression (if compressed).
+        """
+        with self._lock:
+            stats = self._get(message_type)
+            stats.sent += 1
+            stats.in_flight += 1
+            stats.request_bytes += size
+            stats.request_raw_bytes += size if raw_size is None else raw_size
+            stats.encode_time += encode_time
+            stats.compress_time += compress_time
+
+            self._requests[uid] = (message_type, time.perf_counter())
+
+    def response_received(
+        self,
+        uid,
+        size,
+        decode_time,
+        raw_size=None,
+        decompress_time=0
+    ):
+        """Record the response to a request being received"""
+        with self._lock:
+            request = self._requests.pop(uid, None)
+            if request is None:
+                return
+
+            message_type, sent = request
+            stats = self._get(message_type)
+            stats.received += 1
+            stats.in_flight -= 1
+            stats.response_bytes += size
+            stats.response_raw_bytes += size if raw_size is None else raw_size
+            stats.decode_time += decode_time
+            stats.decompress_time += decompress_time
+            stats.rtt.add(time.perf_counter() - sent)
+
+    def request_failed(self, uid):
+        """Record a request that won't receive a response"""
+        with self._lock:
+            request = self._requests.pop(uid, None)
+            if request is None:
+                return
+
+            stats = self._get(request[0])
+            stats.failed += 1
+            stats.in_flight -= 1
+
+    def push_received(
+        self,
+        push_type,
+        size,
+        decode_time,
+        raw_size=None,
+        decompress_time=0
+    ):
+        """Record a message pushed by the server"""
+        with self._lock:
+            stats = self._get(f'push:{push_type}')
+            stats.received += 1
+            stats.response_bytes += size
+            stats.response_raw_bytes += size if raw_size is None else raw_size
+            stats.decode_time += decode_time
+            stats.decompress_time += decompress_time
+
+    def _get(self, message_type):
+        stats = self._stats.get(message_type)
+        if stats is None:
+            stats = self._stats[message_type] = MessageStats(message_type)
+        return stats
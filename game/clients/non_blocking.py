@@ -1,10 +1,18 @@
 
 import asyncio
-import json
 import logging
-import struct
+import random
+import time
 import uuid
 
+from game.clients import framing
+from game.clients.codecs import DEFAULT_CODEC, available_codecs, get_codec
+from game.clients.compression import (
+    Compression,
+    CompressionStats,
+    available_methods
+)
+from game.clients.instrumentation import Instrumentation
 from game.settings import settings
 from game.utils.player import get_player_uid
 
@@ -13,24 +21,101 @@ class NonBlockingClient:
     The `NonBlockingClient` provides an interface for connecting to and
     communicating with the game server that does not block the game loop when
     making a request to wait for a response.
+
+    Requests are pipelined over a single connection, a background reader task
+    routes each response back to the request that made it using the `uid` sent
+    in the message envelope, so any number of requests can be in flight at
+    once.
+
+    If the connection is lost the client reconnects (with exponential backoff
+    and jitter) and notifies `reconnected` listeners once it has handshaked
+    again, requests sent while reconnecting wait for the connection.
     """
 
-    def __init__(self):
+    def __init__(self, host=None, port=None, node=None):
+
+        # The server to connect to and the node to identify as (by default
+        # those in the server settings).
+        self._host = host or settings.server.host
+        self._port = port or settings.server.port
+        self._node = node or get_player_uid()
+
         self._reader = None
         self._writer = None
         self._connected = False
 
+        # The codec used to encode/decode messages, JSON is used until another
+        # codec is negotiated during the handshake.
+        self._codec = get_codec(DEFAULT_CODEC)
+
+        # Compression applied to payloads (none until negotiated), stats are
+        # kept for the lifetime of the client (across reconnects).
+        self._compression_stats = CompressionStats()
+        self._compression = Compression(stats=self._compression_stats)
+
+        # Whether the server supports batching messages (negotiated during
+        # the handshake).
+        self._batch = False
+
+        # The task reading responses from the server
+        self._read_task = None
+
+        # The task reconnecting to the server after the connection is lost,
+        # and an event that is set whenever the client is connected.
+        self._reconnect_task = None
+        self._ready = asyncio.Event()
+
+        # Flag indicating the connection was closed deliberately
+        self._closed = False
+
+        # A table of futures awaiting a response from the server (by uid), the
+        # table is ordered by the time each request was sent.
+        self._pending = {}
+
+        # A table of listeners for messages pushed by the server (by push
+        # type), e.g frames streamed to the client after `subscribe_frames`.
+        self._push_listeners = {}
+
+        # Statistics for the messages sent/received (by message type)
+        self._stats = Instrumentation()
+
+    @property
+    def codec(self):
+        return self._codec
+
+    @property
+    def compression(self):
+        return self._compression
+
     @property
     def connected(self):
         return self._connected
 
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    @property
+    def node(self):
+        return self._node
+
+    @property
+    def reconnecting(self):
+        return self._reconnect_task is not None
+
+    @property
+    def stats(self):
+        return self._stats
+
     async def connect(self):
         """Connect to the game server"""
+        self._closed = False
+        await self._open()
 
-        future = asyncio.open_connection(
-            settings.server.host,
-            settings.server.port
-        )
+    async def _open(self):
+        """Open a connection to the game server and handshake"""
+
+        future = asyncio.open_connection(self._host, self._port)
         try:
             self._reader, self._writer = await asyncio.wait_for(
                 future,
@@ -38,40 +123,362 @@ class NonBlockingClient:
             )
         except asyncio.TimeoutError:
             logging.info('Connect timed out')
+            raise ConnectionError('Connect timed out')
 
-        # Register
-        r = await self.send(
+        # The handshake is always sent as uncompressed JSON
+        self._codec = get_codec(DEFAULT_CODEC)
+        self._compression = Compression(stats=self._compression_stats)
+
+        # Start reading responses from the server
+        self._read_task = asyncio.ensure_future(self._read_loop())
+
+        # Register (advertising the codecs and compression methods we support
+        # in order of preference).
+        codecs = [
+            c for c in settings.server.codecs or [DEFAULT_CODEC]
+            if c in available_codecs()
+        ]
+
+        compression = [
+            m for m in settings.server.compression or []
+            if m in available_methods()
+        ]
+
+        r = await self._request(
             'handshake',
             {
-                'node': get_player_uid(),
-                'password': settings.server.password
+                'node': self._node,
+                'password': settings.server.password,
+                'codecs': codecs,
+                'compression': compression
             }
         )
 
+        # Switch to the codec chosen by the server (servers unaware of codecs
+        # will not choose one).
+        self._codec = get_codec(r.get('codec') or DEFAULT_CODEC)
+        self._compression = Compression(
+            r.get('compression'),
+            self._compression_stats
+        )
+        self._batch = bool(r.get('batch'))
+
         self._connected = True
+        self._ready.set()
+
+    async def close(self):
+        """Close the connection to the game server"""
+
+        self._closed = True
+        self._connected = False
+        self._ready.clear()
+
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+        if self._read_task:
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+            self._read_task = None
+
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+        self._fail_pending(ConnectionError('Connection closed'))
+
+    def add_push_listener(self, push_type, func):
+        """
+        Add a listener for messages of the given type pushed by the server,
+        listeners are called (on the client's event loop) with the message.
+        """
+        try:
+            self._push_listeners[push_type].append(func)
+        except KeyError:
+            self._push_listeners[push_type] = [func]
+
+    def remove_push_listener(self, push_type, func):
+        """Remove a listener for messages of the given type"""
+        if push_type in self._push_listeners:
+            if func in self._push_listeners[push_type]:
+                self._push_listeners[push_type].remove(func)
+
+    async def batch(self, commands):
+        """
+        Send several messages to the game server in a single request,
+        returning the responses in the same order. Each command is either a
+        message type or a (message type, message) pair, for example:
+
+            scene, player = await client.batch(['scene:read', 'player:read'])
+
+        If the server doesn't support batching the messages are sent as
+        individual requests (without waiting for each response in turn).
+        """
+
+        messages = []
+        for command in commands:
+            if isinstance(command, str):
+                command = (command, None)
+
+            messages.append({'type': command[0], 'message': command[1]})
+
+        if self._batch:
+            response = await self.send('batch', messages)
+            if 'responses' in response:
+                return response['responses']
+
+            logging.warning(f'Batch failed: {response}')
+
+        return list(await asyncio.gather(*[
+            self.send(m['type'], m['message']) for m in messages
+        ]))
 
     async def send(self, message_type, message=None):
         """Send a message to the game server"""
 
+        if self._reconnect_task:
+
+            # Wait for the connection to be re-established
+            await self._ready.wait()
+
+        return await self._request(message_type, message)
+
+    async def _request(self, message_type, message=None):
+        uid = str(uuid.uuid4())
+
         # Build the message to send
-        json_data = json.dumps({
-            'uid': str(uuid.uuid4()),
+        start = time.perf_counter()
+        data = self._codec.encode({
+            'uid': uid,
             'type': message_type,
             'message': message
-        }).encode()
+        })
+        encode_time = time.perf_counter() - start
+
+        start = time.thread_time()
+        payload = self._compression.compress(data)
+        compress_time = time.thread_time() - start
+
+        # Register interest in the response before sending the request so the
+        # reader can't receive the response before we're waiting for it.
+        future = asyncio.get_running_loop().create_future()
+        self._pending[uid] = future
+
+        try:
+            self._send(payload)
+            self._stats.request_sent(
+                uid,
+                message_type,
+                len(payload),
+                encode_time,
+                len(data),
+                compress_time
+            )
+            return await future
+
+        finally:
+            self._pending.pop(uid, None)
+
+            # No-op if the response was received
+            self._stats.request_failed(uid)
+
+    def _send(self, payload):
+        framing.write_frame_async(self._writer, payload)
+
+    async def _receive(self):
+        """
+        Return the next message received as (message, size, decode time,
+        size before compression, decompress time).
+        """
+
+        payload = await framing.read_frame_async(self._reader)
+
+        start = time.thread_time()
+        data = self._compression.decompress(payload)
+        decompress_time = time.thread_time() - start
+
+        start = time.perf_counter()
+        message = self._codec.decode(data)
+        decode_time = time.perf_counter() - start
+
+        return message, len(payload), decode_time, len(data), decompress_time
+
+    async def _read_loop(self):
+        """Read responses from the server and route them to their requests"""
+
+        try:
+            while True:
+                self._dispatch(*await self._receive())
+
+        except asyncio.CancelledError:
+            raise
+
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            logging.info(f'Connection lost: {error}')
+            self._lost(ConnectionError('Connection lost'))
+
+        except Exception as error:
+            logging.exception('Unable to read response')
+            self._lost(error)
+
+    def _lost(self, error):
+        """Handle the connection to the server being lost"""
+
+        was_connected = self._connected
+
+        self._connected = False
+        self._ready.clear()
+        self._fail_pending(error)
+
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+        # Only reconnect if we'd successfully connected (a failure during the
+        # initial handshake is reported to whoever called `connect`).
+        if (
+            was_connected
+            and not self._closed
+            and settings.server.reconnect
+            and not self._reconnect_task
+        ):
+            self._reconnect_task = asyncio.ensure_future(self._reconnect())
+
+    async def _reconnect(self):
+        """
+        Attempt to reconnect to the server until successful. The delay between
+        attempts backs off exponentially and is randomized (full jitter) so
+        that clients disconnected at the same time (e.g by a server restart)
+        don't reconnect in lock step.
+        """
 
-        return await self._send(json_data)
+        attempt = 0
+        while not self._closed:
 
-    async def _send(self, json_data):
-        self._writer.write(struct.pack('>I', len(json_data) * 4))
-        self._writer.write(json_data)
+            delay = min(
+                settings.server.reconnect_max_delay,
+                settings.server.reconnect_min_delay * 2 ** attempt
+            )
+            await asyncio.sleep(random.uniform(0, delay))
+            attempt += 1
+
+            try:
+                await asyncio.wait_for(self._open(), timeout=10)
+                break
+
+            except (
+                OSError,
+                ConnectionError,
+                asyncio.IncompleteReadError,
+                asyncio.TimeoutError
+            ):
+                logging.info(f'Reconnect attempt {attempt} failed')
+                await self._drop_read_task()
+
+        self._reconnect_task = None
+
+        if self._closed:
+
+            # The client was closed while we were trying to reconnect
+            return
+
+        logging.info(f'Reconnected after {attempt} attempt(s)')
+
+        self._dispatch({'push': 'reconnected'})
+
+    async def _drop_read_task(self):
+        """Stop the read task for a failed connection attempt"""
+
+        if self._read_task and not self._read_task.done():
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+
+        self._read_task = None
+
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+    def _dispatch(
+        self,
+        response,
+        size=None,
+        decode_time=0,
+        raw_size=None,
+        decompress_time=0
+    ):
+        """
+        Resolve the request the given response is for, the size and decode
+        (and decompress) timings of responses received from the server are
+        recorded in the stats.
+        """
+
+        if isinstance(response, dict) and 'push' in response:
+
+            if size is not None:
+                self._stats.push_received(
+                    response['push'],
+                    size,
+                    decode_time,
+                    raw_size,
+                    decompress_time
+                )
+
+            # Messages pushed by the server aren't a response to a request
+            for func in self._push_listeners.get(response['push'], []):
+                try:
+                    func(response)
+                except Exception:
+                    logging.exception('Push listener failed')
+            return
+
+        uid = response.pop('uid', None) if isinstance(response, dict) else None
+
+        if uid is None:
+
+            # The server didn't tag the response with a uid, as the server
+            # answers requests in order we fall back to resolving the oldest
+            # request still waiting for a response.
+            uid = next(
+                (u for u, f in self._pending.items() if not f.done()),
+                None
+            )
+
+            if uid is None:
+                logging.warning(f'Unexpected response: {response}')
+                return
+
+        elif uid not in self._pending:
+
+            # A late response to a request that has since timed out or been
+            # cancelled.
+            logging.warning(f'Dropped response to request {uid}')
+            return
+
+        future = self._pending[uid]
+
+        if size is not None:
+            self._stats.response_received(
+                uid,
+                size,
+                decode_time,
+                raw_size,
+                decompress_time
+            )
 
-        response_len = struct.unpack('>I', await self._reader.read(4))[0]
-        remaining = response_len
+        if not future.done():
+            future.set_result(response)
 
-        response = b''
-        while remaining > 0:
-            response += await self._reader.read(remaining)
-            remaining = response_len - len(response) * 4
+    def _fail_pending(self, error):
+        """Fail all requests awaiting a response"""
 
-        return json.loads(response.decode('utf8') or '{}')
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
@@ -0,0 +1,116 @@
+"""
+The prefetch module holds responses to requests sent ahead of the data being
+needed (e.g the chunks of the overworld the party is heading towards, or the
+scene of a cave next to the party), so that when it is needed it's already
+in memory rather than fetched with a blocking request.
+
+Prefetch requests are submitted to the blocking client's IO thread and so
+never block the game loop, e.g:
+
+    prefetcher.prefetch(('scene', x, y), 'scene:read', {'position': [x, y]})
+    ...
+    scene = prefetcher.take(('scene', x, y)) or client.send('scene:read')
+
+"""
+
+import collections
+import concurrent.futures
+import logging
+
+__all__ = ['Prefetcher']
+
+
+class Prefetcher:
+    """
+    A cache of prefetched responses (by key). Only the latest `limit`
+    requests are held, older requests are cancelled (or discarded if already
+    answered).
+    """
+
+    def __init__(self, client, limit):
+        self._client = client
+        self._limit = limit
+
+        # The requests made (by key), oldest first
+        self._requests = collections.OrderedDict()
+
+        # The number of requests taken that had (or hadn't) been prefetched
+        self._hits = 0
+        self._misses = 0
+
+    def __contains__(self, key):
+        return key in self._requests
+
+    def __len__(self):
+        return len(self._requests)
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def clear(self):
+        """Cancel/discard all prefetched requests"""
+
+        for future in self._requests.values():
+            future.cancel()
+
+        self._requests.clear()
+
+    def discard(self, key):
+        """Cancel/discard a prefetched request (if one was made)"""
+
+        future = self._requests.pop(key, None)
+        if future:
+            future.cancel()
+
+    def prefetch(self, key, message_type, message=None):
+        """
+        Send a request in the background (unless a request for the key has
+        already been made), returns True if a request was sent.
+        """
+
+        if key in self._requests or not self._client.connected:
+            return False
+
+        self._requests[key] = self._client.submit(message_type, message)
+
+        while len(self._requests) > self._limit:
+            self._requests.popitem(last=False)[1].cancel()
+
+        return True
+
+    def take(self, key, timeout=None):
+        """
+        Return (and forget) the response to a prefetched request, waiting for
+        it if it's still in flight. None is returned if no request was made
+        for the key or the request failed.
+        """
+
+        future = self._requests.pop(key, None)
+        if future is None:
+            self._misses += 1
+            return None
+
+        try:
+            response = future.result(timeout)
+
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self._misses += 1
+            return None
+
+        except (Exception, concurrent.futures.CancelledError) as error:
+            logging.warning(f'Prefetch failed {key}: {error}')
+            self._misses += 1
+            return None
+
+        if 'error' in response:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        return response
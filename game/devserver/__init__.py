@@ -0,0 +1,7 @@
+"""
+A local stand-in for the game server, for development and benchmarking the
+client without a remote server:
+
+    python -m game.devserver --size 200x100 --frame-rate 5
+
+"""
@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import logging
+
+from game.devserver.server import DevServer
+
+
+def parse_size(value):
+    w, h = value.lower().split('x')
+    return (int(w), int(h))
+
+
+async def main(args):
+    server = DevServer(
+        size=args.size,
+        frame_rate=args.frame_rate,
+        autopilot=args.autopilot,
+        password=args.password,
+        seed=args.seed,
+        batch=not args.no_batch
+    )
+    await server.start(args.host, args.port)
+
+    # Serve until interrupted
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Run a dev game server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=27015)
+    parser.add_argument('--password', default='password')
+    parser.add_argument(
+        '--size',
+        type=parse_size,
+        default=(200, 100),
+        help='The size of the overworld (WxH)'
+    )
+    parser.add_argument(
+        '--frame-rate',
+        type=float,
+        default=0,
+        help='Frames produced per second while no player leads the party'
+    )
+    parser.add_argument(
+        '--autopilot',
+        action='store_true',
+        help='The party is always led by the server (players only observe)'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--no-batch',
+        action='store_true',
+        help="Don't support batching messages (as for older servers)"
+    )
+
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
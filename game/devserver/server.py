@@ -0,0 +1,400 @@
+"""
+An asyncio stand-in for the game server speaking the same protocol as the
+clients (see `game.clients`).
+"""
+
+import asyncio
+import logging
+
+from game.clients import framing
+from game.clients.codecs import DEFAULT_CODEC, available_codecs, get_codec
+from game.clients.compression import Compression, available_methods
+from game.devserver.world import World, sprite_sheet_json_type
+
+__all__ = ['DevServer']
+
+
+# The number of most recent frames kept encoded (per codec), older frames are
+# encoded again if they're asked for.
+ENCODED_FRAMES_CACHE_SIZE = 1024
+
+
+class DevServer:
+    """
+    A development game server hosting a single `World`. If `frame_rate` is
+    set the world produces frames at that rate (the party wanders the
+    overworld) whenever no player is leading the party, or always if
+    `autopilot` is set. If `batch` is unset the server doesn't support
+    batching messages (as for older servers).
+    """
+
+    def __init__(
+        self,
+        size=(200, 100),
+        frame_rate=0,
+        autopilot=False,
+        password='password',
+        seed=0,
+        batch=True
+    ):
+        self.world = World(size, seed)
+        self.world.add_frame_listener(self._on_frame)
+
+        self.frame_rate = frame_rate
+        self.autopilot = autopilot
+        self.password = password
+        self.batch = batch
+
+        self._connections = set()
+        self._server = None
+
+        # The tasks serving each connection
+        self._serve_tasks = set()
+        self._tick_task = None
+
+        # A table of frames encoded for clients that ask for frames to be
+        # sent encoded (by codec name then frame number).
+        self._encoded_frames = {}
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    def encode_frames(self, codec, frames):
+        """
+        Return frames (a list of [frame_no, frame]) with each frame's scene
+        changes encoded by the codec (the rest of the frame is sent as is so
+        clients can read it without decoding the scene changes), recent
+        frames are only encoded once per codec.
+        """
+
+        cache = self._encoded_frames.setdefault(codec.name, {})
+        oldest_frame_no = self.world.frame_no - ENCODED_FRAMES_CACHE_SIZE
+
+        encoded = []
+        for frame_no, frame in frames:
+            data = cache.get(frame_no)
+            if data is None:
+                data = dict(
+                    frame,
+                    scene_changes=codec.encode_nested(
+                        frame.get('scene_changes') or {}
+                    )
+                )
+                if frame_no > oldest_frame_no:
+                    cache[frame_no] = data
+            encoded.append([frame_no, data])
+
+        # Drop frames that are no longer recent (trimmed in bulk so the cost
+        # is spread across the frames encoded).
+        if len(cache) > 2 * ENCODED_FRAMES_CACHE_SIZE:
+            for frame_no in [n for n in cache if n <= oldest_frame_no]:
+                del cache[frame_no]
+
+        return encoded
+
+    async def start(self, host='127.0.0.1', port=27015):
+        """Start serving"""
+
+        self._server = await asyncio.start_server(self._serve, host, port)
+
+        if self.frame_rate:
+            self._tick_task = asyncio.ensure_future(self._tick())
+
+        logging.info(f'Dev server listening on {host}:{self.port}')
+
+    async def stop(self):
+        """Stop serving and close all connections"""
+
+        if self._tick_task:
+            self._tick_task.cancel()
+            try:
+                await self._tick_task
+            except asyncio.CancelledError:
+                pass
+            self._tick_task = None
+
+        self._server.close()
+        for connection in list(self._connections):
+            connection.close()
+
+        # Wait for the connections to finish serving (rather than leaving
+        # them to be cancelled when the event loop is shut down).
+        await asyncio.gather(*self._serve_tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        connection = Connection(self, reader, writer)
+        self._connections.add(connection)
+
+        task = asyncio.current_task()
+        self._serve_tasks.add(task)
+
+        try:
+            await connection.serve()
+
+        finally:
+            self._connections.discard(connection)
+            self._serve_tasks.discard(task)
+            self.world.leave(connection.node)
+
+    async def _tick(self):
+        """Produce frames at the configured frame rate"""
+
+        while True:
+            await asyncio.sleep(1 / self.frame_rate)
+
+            world = self.world
+            if world.party_scene is None and (
+                self.autopilot
+                or world.party_leader is None
+            ):
+                world.wander()
+
+    def _on_frame(self, frame_no, frame):
+        for connection in self._connections:
+            connection.push_frame(frame_no, frame)
+
+
+class Connection:
+    """
+    A connection from a client to the dev server.
+    """
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.world = server.world
+        self.node = None
+
+        self._reader = reader
+        self._writer = writer
+
+        self._codec = get_codec(DEFAULT_CODEC)
+        self._compression = Compression()
+
+        # The next frame number to push to the client (if subscribed) and
+        # whether to push frames encoded.
+        self._push_frame_no = None
+        self._push_encoded = False
+
+    def close(self):
+        self._writer.close()
+
+    async def serve(self):
+        """Handle requests until the client disconnects"""
+
+        try:
+            while True:
+                payload = await framing.read_frame_async(self._reader)
+                request = self._codec.decode(
+                    self._compression.decompress(payload)
+                )
+
+                try:
+                    message_type = request['type']
+                    response = self.handle(message_type, request['message'])
+
+                except (KeyError, TypeError, ValueError) as error:
+
+                    # Answer a malformed message with an error rather than
+                    # dropping the connection.
+                    logging.warning(f'Bad message: {error!r}')
+                    message_type = None
+                    response = {'error': f'bad_message: {error!r}'}
+
+                if isinstance(request, dict):
+                    response['uid'] = request.get('uid')
+                self.send(response)
+
+                # Switch codec/compression once the handshake is answered
+                if message_type == 'handshake':
+                    self._codec = get_codec(response['codec'])
+                    self._compression = Compression(response['compression'])
+
+                # Send any frames due to the client after subscribing
+                if message_type == 'subscribe_frames':
+                    self.push_frame(self.world.frame_no, None)
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            self._writer.close()
+
+    def send(self, message):
+        data = self._compression.compress(self._codec.encode(message))
+        framing.write_frame_async(self._writer, data)
+
+    def push_frame(self, frame_no, frame):
+        """Push frames up to the given frame to a subscribed client"""
+
+        if self._push_frame_no is None or self._push_frame_no > frame_no:
+            return
+
+        frames = self.world.get_frames(self._push_frame_no)
+        frames = [f for f in frames if f[0] <= frame_no]
+        self._push_frame_no = frame_no + 1
+
+        if self._push_encoded:
+            frames = self.server.encode_frames(self._codec, frames)
+
+        self.send({'push': 'frames', 'frames': frames})
+
+    def handle(self, message_type, message):
+        """Return the response to a message"""
+
+        handler = getattr(
+            self,
+            'on_' + message_type.replace(':', '_'),
+            None
+        )
+
+        if handler is None:
+            return {'error': f'unknown_message_type: {message_type}'}
+
+        return handler(message or {})
+
+    # Handlers
+
+    def on_batch(self, messages):
+        if not self.server.batch:
+            return {'error': 'unknown_message_type: batch'}
+
+        return {
+            'responses': [
+                self.handle(m['type'], m.get('message')) for m in messages
+            ]
+        }
+
+    def on_game_join(self, message):
+        world = self.world
+
+        if self.node not in world.players:
+            return {'joined': False, 'reason': 'player_not_registered'}
+
+        if world.party_scene and self.node not in world.party_members:
+            return {'joined': False, 'reason': 'party_not_in_overworld'}
+
+        world.join(self.node, leader=not self.server.autopilot)
+        return {'joined': True}
+
+    def on_get_frames(self, message):
+        frames = self.world.get_frames(message.get('frame_no', 0))
+
+        if message.get('encoded'):
+            frames = self.server.encode_frames(self._codec, frames)
+
+        return {'frames': frames}
+
+    def on_handshake(self, message):
+        self.node = message['node']
+
+        codec = next(
+            (c for c in message.get('codecs', []) if c in available_codecs()),
+            DEFAULT_CODEC
+        )
+
+        compression = [
+            m for m in message.get('compression', [])
+            if m in available_methods()
+        ]
+
+        return {
+            'authenticated': message.get('password') == self.server.password,
+            'codec': codec,
+            'compression': compression,
+            'batch': self.server.batch
+        }
+
+    def on_move(self, message):
+        world = self.world
+
+        if world.party_scene:
+            frame = world.move_player(self.node, message['direction'])
+            if not frame:
+                return {}
+            return {
+                'position': frame['data']['position'],
+                'scene_changes': frame['scene_changes']
+            }
+
+        if world.party_leader != self.node:
+            return {}
+
+        frame = world.move_party(message['direction'])
+        return {
+            'position': frame['data']['position'],
+            'scene_changes': frame['scene_changes']
+        }
+
+    def on_party_enter_scene(self, message):
+        world = self.world
+
+        if world.party_leader != self.node or world.party_scene:
+            return {'success': False}
+
+        world.enter_scene()
+        return {'success': True}
+
+    def on_party_read(self, message):
+        world = self.world
+        return {
+            'members': world.party_members,
+            'leader': world.party_leader,
+            'position': world.party_position
+        }
+
+    def on_peek(self, message):
+        return {'frame_no': self.world.frame_no}
+
+    def on_player_create(self, message):
+        player = self.world.register_player(
+            self.node,
+            message['name'],
+            message['race'],
+            message['profession']
+        )
+        return {'success': True, 'player': player}
+
+    def on_player_end_turn(self, message):
+        self.world.end_turn(self.node)
+        return {}
+
+    def on_player_read(self, message):
+        player = self.world.players.get(self.node)
+        if player is None:
+            return {'error': 'player_not_registered'}
+
+        # Copy the player as the response is tagged with the request's uid
+        return dict(player)
+
+    def on_scene_read(self, message):
+        world = self.world
+
+        if 'position' in message:
+            scene = world.scene(message['position'])
+        else:
+            scene = world.party_scene or world.scene(world.party_position)
+
+        return {'size': scene['size'], 'tiles': scene['tiles']}
+
+    def on_sprite_sheet_read(self, message):
+        return sprite_sheet_json_type()
+
+    def on_subscribe_frames(self, message):
+        self._push_frame_no = max(0, message.get('frame_no', 0))
+        self._push_encoded = bool(message.get('encoded'))
+        return {'subscribed': True}
+
+    def on_world_read(self, message):
+        return {'size': self.world.size, 'tiles': self.world.tiles}
+
+    def on_world_read_chunk(self, message):
+        x, y = message['position']
+        size, tiles = self.world.region(x, y, *message['size'])
+        return {
+            'world_size': self.world.size,
+            'position': [x, y],
+            'size': size,
+            'tiles': tiles
+        }
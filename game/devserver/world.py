@@ -0,0 +1,404 @@
+"""
+The game world simulated by the development server.
+"""
+
+import random
+
+__all__ = ['World']
+
+
+# The sprite sheet sent to clients, each entity type is a tree of named types
+# with an id used to build the sprite paths sent in tiles/scene changes.
+SPRITE_SHEET = {
+    'biomes': {
+        'hills': 1,
+        'mountains': 2,
+        'plains': 3,
+        'water': 4,
+        'woods': (5, {'broadleaf': 1, 'evergreen': (2, {'ancient': 1})})
+    },
+    'landmarks': {'cave': 1},
+    'parties': {'player': 1},
+    'terrain': {'earth': 1, 'stone': 2, 'grass': (3, {'long': 1})},
+    'scenary': {'stone_wall': 1, 'tree': 2},
+    'items': {'short_sword': 1},
+    'creatures': {'dwarf': 1, 'goblin': 2, 'human': 3, 'rat': 4}
+}
+
+# Sprite paths used when generating the world and scenes
+BIOMES = [[1], [2], [3], [4], [5], [5, 1], [5, 2], [5, 2, 1]]
+CAVE = [1]
+PARTY = [1]
+PLAYER = [1]
+SCENE_CREATURES = [[2], [4]]
+SCENE_ITEMS = [[1]]
+SCENE_SCENARY = [[2]]
+SCENE_TERRAIN = [[1], [2], [3], [3, 1]]
+STONE_WALL = [1]
+
+# The (x, y) offset for each direction a party/player can move in (in the
+# order the client's controls are defined).
+DIRECTIONS = [
+    (0, -1),    # up
+    (1, -1),    # up right
+    (1, 0),     # right
+    (1, 1),     # down right
+    (0, 1),     # down
+    (-1, 1),    # down left
+    (-1, 0),    # left
+    (-1, -1)    # up left
+]
+
+# The size of generated scenes
+SCENE_SIZE = (60, 30)
+
+# The action points each player has per turn in a scene
+ACTION_POINTS = 10
+
+
+def sprite_sheet_json_type(types=None):
+    """Return the sprite sheet as sent to clients"""
+
+    json_type = {}
+    for name, value in (types or SPRITE_SHEET).items():
+
+        if isinstance(value, tuple):
+            value, sub_types = value
+            json_type[name] = {
+                'id': value,
+                'types': sprite_sheet_json_type(sub_types)
+            }
+
+        elif isinstance(value, dict):
+            json_type[name] = {'types': sprite_sheet_json_type(value)}
+
+        else:
+            json_type[name] = {'id': value}
+
+    return json_type
+
+
+class World:
+    """
+    A world containing an overworld, a single party and the scenes the party
+    can enter. Every change to the world is recorded as a frame.
+    """
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.rand = random.Random(seed)
+        self.seed = seed
+
+        # The overworld as a list of [biome, landmark, party] tiles
+        self.tiles = self._generate_overworld()
+
+        # The party (and where it is)
+        self.party_members = []
+        self.party_leader = None
+        self.party_position = [size[0] // 2, size[1] // 2]
+        self.party_scene = None
+        self.tile(*self.party_position)[2] = PARTY
+
+        # Registered players (by node)
+        self.players = {}
+
+        # A table of generated scenes (by overworld position)
+        self.scenes = {}
+
+        # The frames produced so far, and listeners to notify of new frames
+        self.frames = []
+        self._frame_listeners = []
+
+    @property
+    def frame_no(self):
+        return len(self.frames) - 1
+
+    # Frames
+
+    def add_frame(self, frame):
+        """Add a frame and notify listeners"""
+
+        frame_no = len(self.frames)
+        self.frames.append(frame)
+
+        for func in self._frame_listeners:
+            func(frame_no, frame)
+
+        return frame_no
+
+    def add_frame_listener(self, func):
+        """Add a listener to call with each new frame"""
+        self._frame_listeners.append(func)
+
+    def get_frames(self, frame_no):
+        """Return frames from the given frame number as [frame_no, frame]"""
+        frame_no = max(0, frame_no)
+        return [[frame_no + i, f] for i, f in enumerate(self.frames[frame_no:])]
+
+    # Overworld
+
+    def tile(self, x, y):
+        """Return the overworld tile at the given position"""
+        return self.tiles[y * self.size[0] + x]
+
+    def region(self, x, y, w, h):
+        """
+        Return the size of and tiles within a region of the overworld
+        (clipped to the overworld).
+        """
+
+        x0, y0 = max(0, x), max(0, y)
+        x1 = min(self.size[0], x + w)
+        y1 = min(self.size[1], y + h)
+
+        if x1 <= x0 or y1 <= y0:
+            return [0, 0], []
+
+        tiles = []
+        for ty in range(y0, y1):
+            row = ty * self.size[0]
+            tiles.extend(self.tiles[row + x0:row + x1])
+
+        return [x1 - x0, y1 - y0], tiles
+
+    def tile_index(self, x, y):
+        return y * self.size[0] + x
+
+    def move_party(self, direction):
+        """Move the party, returning the party move frame"""
+
+        dx, dy = DIRECTIONS[direction]
+        x, y = self.party_position
+        nx = max(0, min(self.size[0] - 1, x + dx))
+        ny = max(0, min(self.size[1] - 1, y + dy))
+
+        self.tile(x, y)[2] = -1
+        self.tile(nx, ny)[2] = PARTY
+        self.party_position = [nx, ny]
+
+        frame = {
+            'actor': 'party',
+            'action': 'move',
+            'data': {'position': [nx, ny]},
+            'scene_changes': {
+                str(self.tile_index(x, y)): list(self.tile(x, y)),
+                str(self.tile_index(nx, ny)): list(self.tile(nx, ny))
+            }
+        }
+        self.add_frame(frame)
+
+        return frame
+
+    def wander(self):
+        """Move the party in a random direction"""
+        return self.move_party(self.rand.randrange(len(DIRECTIONS)))
+
+    # Scenes
+
+    def enter_scene(self):
+        """The party enters the scene at its current position"""
+
+        self.party_scene = self.scene(self.party_position)
+        self.party_scene['active_player'] = self.party_members[0] \
+                if self.party_members else None
+
+        tiles = self.party_scene['tiles']
+        scene_changes = {}
+        players = {}
+        for node in self.party_members:
+            player = self.players[node]
+            player['action_points'] = [ACTION_POINTS, ACTION_POINTS]
+            i = self._place_player(player, self.party_scene)
+            if i is not None:
+                scene_changes[str(i)] = list(tiles[i])
+
+            # Where each player starts in the scene (by node)
+            players[str(node)] = {
+                'action_points': list(player['action_points']),
+                'position': list(player['position'])
+            }
+
+        self.add_frame({
+            'actor': 'party',
+            'action': 'enter_scene',
+            'data': {
+                'active_player': self.party_scene['active_player'],
+                'players': players
+            },
+            'scene_changes': scene_changes
+        })
+
+    def scene(self, position):
+        """Return the scene at the given overworld position"""
+
+        key = tuple(position)
+        if key not in self.scenes:
+            self.scenes[key] = self._generate_scene(key)
+        return self.scenes[key]
+
+    def end_turn(self, node):
+        """End the given player's turn"""
+
+        scene = self.party_scene
+        if not scene or scene['active_player'] != node:
+            return
+
+        members = self.party_members
+        active = members[(members.index(node) + 1) % len(members)]
+        scene['active_player'] = active
+        self.players[active]['action_points'] = [ACTION_POINTS, ACTION_POINTS]
+
+        self.add_frame({
+            'actor': 'player',
+            'action': 'end_turn',
+            'data': {
+                'active_player': active,
+                'action_points': list(self.players[active]['action_points'])
+            }
+        })
+
+    def move_player(self, node, direction):
+        """Move a player within the party's scene"""
+
+        scene = self.party_scene
+        player = self.players[node]
+        if (
+            not scene
+            or scene['active_player'] != node
+            or player['action_points'][0] <= 0
+        ):
+            return None
+
+        w, h = scene['size']
+        dx, dy = DIRECTIONS[direction]
+        x, y = player['position']
+        nx = max(0, min(w - 1, x + dx))
+        ny = max(0, min(h - 1, y + dy))
+
+        tiles = scene['tiles']
+        to_tile = tiles[ny * w + nx]
+        if to_tile[1] != -1 or to_tile[3] != -1:
+            return None
+
+        tiles[y * w + x][3] = -1
+        to_tile[3] = PLAYER
+        player['position'] = [nx, ny]
+        player['action_points'][0] -= 1
+
+        frame = {
+            'actor': 'player',
+            'action': 'move',
+            'data': {
+                'active_player': node,
+                'action_points': list(player['action_points']),
+                'position': [nx, ny]
+            },
+            'scene_changes': {
+                str(y * w + x): list(tiles[y * w + x]),
+                str(ny * w + nx): list(to_tile)
+            }
+        }
+        self.add_frame(frame)
+
+        return frame
+
+    # Players
+
+    def register_player(self, node, name, race, profession):
+        """Register a player"""
+
+        self.players[node] = {
+            'name': name,
+            'race': race,
+            'profession': profession,
+            'action_points': [ACTION_POINTS, ACTION_POINTS],
+            'position': [0, 0]
+        }
+        return self.players[node]
+
+    def join(self, node, leader=True):
+        """Add a player to the party"""
+
+        if node not in self.party_members:
+            self.party_members.append(node)
+
+        if leader and self.party_leader is None:
+            self.party_leader = node
+
+    def leave(self, node):
+        """Remove a player from the party"""
+
+        if node in self.party_members:
+            self.party_members.remove(node)
+
+        if self.party_leader == node:
+            self.party_leader = None
+
+    # Generation
+
+    def _generate_overworld(self):
+        """Generate the overworld with long runs of each biome"""
+
+        rand = self.rand
+        w, h = self.size
+
+        tiles = []
+        biome = rand.choice(BIOMES)
+        for i in range(w * h):
+
+            if rand.random() < 0.05:
+                biome = rand.choice(BIOMES)
+
+            landmark = CAVE if rand.random() < 0.002 else -1
+            tiles.append([biome, landmark, -1])
+
+        return tiles
+
+    def _generate_scene(self, position):
+        """Generate a scene (the same scene is generated for a position)"""
+
+        rand = random.Random(hash((self.seed, position)))
+        w, h = SCENE_SIZE
+
+        tiles = []
+        for y in range(h):
+            for x in range(w):
+
+                if x in (0, w - 1) or y in (0, h - 1):
+                    tiles.append([[2], STONE_WALL, -1, -1])
+                    continue
+
+                tiles.append([
+                    rand.choice(SCENE_TERRAIN),
+                    rand.choice(SCENE_SCENARY) if rand.random() < 0.05 else -1,
+                    self._generate_items(rand),
+                    rand.choice(SCENE_CREATURES) if rand.random() < 0.01 else -1
+                ])
+
+        return {'size': [w, h], 'tiles': tiles, 'active_player': None}
+
+    def _generate_items(self, rand):
+        """Return the items on a scene tile, occasionally a pile of them"""
+
+        if rand.random() >= 0.01:
+            return -1
+
+        if rand.random() < 0.25:
+            count = rand.randint(2, 4)
+            return [rand.choice(SCENE_ITEMS) for i in range(count)]
+
+        return rand.choice(SCENE_ITEMS)
+
+    def _place_player(self, player, scene):
+        """
+        Place a player on a free tile within a scene, returning the index of
+        the tile.
+        """
+
+        w, h = scene['size']
+        tiles = scene['tiles']
+        for i, tile in enumerate(tiles):
+            if tile[1] == -1 and tile[3] == -1:
+                tile[3] = PLAYER
+                player['position'] = [i % w, i // w]
+                return i
@@ -1,46 +1,188 @@
+import array
+import collections
 import curses
 import math
 
 from game.settings import settings
 from game.utils.colors import Colors
-from game.utils.sprites import SpriteSheet
+from game.utils.rendering import cells, clamp_bounds, in_bounds
+from game.utils.sprites import SpriteGlyphs, SpritePaths, SpriteSheet
 
 
 class Overworld:
     """
     The game's overworld.
+
+    The overworld is split into square chunks (see `OverworldChunk`) which
+    are loaded on demand (around the party) and evicted least recently used
+    first, so only part of a large world need be held. Tiles within chunks
+    that aren't loaded have nothing in any layer and scene changes to them
+    are ignored (the chunk is fetched as it is when loaded).
+
+    An overworld read whole (`world:read`) is held as a single chunk.
+
+    Within a chunk tiles are stored as a struct of arrays, one array per
+    layer (biome, landmark, party) holding the interned id of each tile's
+    sprite path (see `SpritePaths`), rather than an object per tile.
+    `get_tile` returns a view of a tile.
+
+    The glyph each tile renders as is resolved when the tile is set and held
+    in a further array (see `SpriteGlyphs`), so rendering is an array read.
     """
 
-    def __init__(self, size):
+    def __init__(self, size, chunk_size=None):
         self._size = size
-        self._tiles = [OverworldTile() for i in range(size[0] * size[1])]
+        self._chunk_size = chunk_size or max(size)
+
+        # Sprite paths used by the overworld's tiles (by id)
+        self._paths = SpritePaths()
+
+        # The chunks loaded (by chunk key), least recently used first
+        self._chunks = collections.OrderedDict()
+
+        # The glyphs the overworld's tiles render as
+        self._glyphs = SpriteGlyphs(self._paths)
+
+        # The indexes of tiles changed since the overworld was last rendered,
+        # and a flag indicating that all tiles need to be rendered.
+        self._dirty = set()
+        self._redraw = True
+
+        # The generation of glyphs the overworld was last rendered with, and
+        # the bounds of the tiles rendered.
+        self._glyph_generation = None
+        self._rendered = None
+
+    def __contains__(self, key):
+        return key in self._chunks
+
+    def __len__(self):
+        return len(self._chunks)
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    @property
+    def glyphs(self):
+        return self._glyphs
+
+    @property
+    def paths(self):
+        return self._paths
 
     @property
     def size(self):
         return list(self._size)
 
+    def add_chunk(self, json_type):
+        """
+        Add a chunk of the overworld as read from the server
+        (`world:read_chunk`), replacing the chunk if already loaded.
+        """
+
+        x, y = json_type['position']
+        w, h = json_type['size']
+
+        if w <= 0 or h <= 0:
+
+            # The chunk lies outside of the world
+            return
+
+        key = self.get_chunk_key(y, x)
+        assert [y, x] == self.get_chunk_position(key), 'Chunk misaligned.'
+
+        chunk = OverworldChunk(self, [y, x], [h, w])
+        chunk.load(json_type['tiles'])
+
+        self._chunks[key] = chunk
+        self._chunks.move_to_end(key)
+        self._redraw = True
+
     def apply_scene_changes(self, scene_changes):
         """Apply a set of scene changes to the overworld"""
 
+        sprite_id = self._paths.id
+        locate = self.locate
+        dirty = self._dirty
+
         for tile_index, sprites in scene_changes.items():
             biome, landmark, party = sprites
 
-            tile = self.get_tile(int(tile_index))
+            tile_index = int(tile_index)
+            chunk, i = locate(tile_index)
+            if chunk is None:
+                continue
+
+            chunk.biomes[i] = biome = sprite_id(biome)
+            chunk.landmarks[i] = landmark = sprite_id(landmark)
+            chunk.parties[i] = party = sprite_id(party)
+            chunk.tile_glyphs[i] = self.get_glyph_id(biome, landmark, party)
+            chunk.changed()
+            dirty.add(tile_index)
+
+    def evict_chunks(self, limit, keep=()):
+        """
+        Evict the least recently used chunks until no more than `limit`
+        remain, chunks in `keep` are never evicted. Returns the keys of the
+        chunks evicted.
+        """
+
+        evicted = []
+        for key in list(self._chunks):
+            if len(self._chunks) <= limit:
+                break
 
-            if biome == -1:
-                tile.biome = None
-            else:
-                tile.biome = tuple(biome)
+            if key in keep:
+                continue
 
-            if landmark == -1:
-                tile.landmark = None
-            else:
-                tile.landmark = tuple(landmark)
+            del self._chunks[key]
+            evicted.append(key)
 
-            if party == -1:
-                tile.party = None
-            else:
-                tile.party = tuple(party)
+        if evicted:
+            self._redraw = True
+
+        return evicted
+
+    def get_chunk_key(self, y, x):
+        """Return the key of the chunk containing the y, x coordinates"""
+        return (y // self._chunk_size, x // self._chunk_size)
+
+    def get_chunk_keys(self, y, x, radius):
+        """
+        Return the keys of the chunks within `radius` chunks of the chunk
+        containing the y, x coordinates (nearest first).
+        """
+
+        cy, cx = self.get_chunk_key(y, x)
+        max_cy, max_cx = self.get_chunk_key(
+            self._size[0] - 1,
+            self._size[1] - 1
+        )
+
+        keys = [
+            (ky, kx)
+            for ky in range(max(0, cy - radius), min(max_cy, cy + radius) + 1)
+            for kx in range(max(0, cx - radius), min(max_cx, cx + radius) + 1)
+        ]
+        keys.sort(key=lambda k: max(abs(k[0] - cy), abs(k[1] - cx)))
+
+        return keys
+
+    def get_chunk_position(self, key):
+        """Return the y, x coordinates of the top left tile of a chunk"""
+        return [key[0] * self._chunk_size, key[1] * self._chunk_size]
+
+    def get_glyph_id(self, biome, landmark, party):
+        """Return the glyph id for a tile's top most layer (by sprite id)"""
+
+        if party:
+            return self._glyphs.id('parties', party)
+
+        if landmark:
+            return self._glyphs.id('landmarks', landmark)
+
+        return self._glyphs.id('biomes', biome)
 
     def get_offset(self, yx, size):
         """
@@ -62,91 +204,368 @@ class Overworld:
     def get_tile(self, y, x=None):
         """Return a tile either by index or y,x coordinates"""
         if x is None:
-            return self._tiles[y]
-        return self._tiles[y * self._size[1] + x]
+            return OverworldTile(self, y)
+        return OverworldTile(self, y * self._size[1] + x)
+
+    def has_chunk(self, key):
+        """Return True if the chunk is loaded (marking it as recently used)"""
+
+        if key in self._chunks:
+            self._chunks.move_to_end(key)
+            return True
+
+        return False
+
+    def locate(self, tile_index):
+        """
+        Return the chunk containing a tile and the tile's index within the
+        chunk, or (None, None) if the chunk isn't loaded.
+        """
+
+        y, x = divmod(tile_index, self._size[1])
+        chunk = self._chunks.get(
+            (y // self._chunk_size, x // self._chunk_size)
+        )
+
+        if chunk is None:
+            return None, None
+
+        return chunk, (y - chunk.y) * chunk.w + (x - chunk.x)
+
+    def restore(self, snapshot):
+        """
+        Restore the overworld's tiles from a snapshot, the chunks loaded are
+        restored to those loaded when the snapshot was taken (chunks evicted
+        since are restored from the snapshot, chunks loaded since dropped).
+        """
+
+        h, w = self._size
+        chunk_size = self._chunk_size
+
+        chunks = collections.OrderedDict()
+        for key, layers in snapshot.items():
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                y, x = self.get_chunk_position(key)
+                chunk = OverworldChunk(
+                    self,
+                    [y, x],
+                    [min(chunk_size, h - y), min(chunk_size, w - x)]
+                )
+
+            chunk.restore(layers)
+            chunks[key] = chunk
+
+        self._chunks = chunks
+        self._redraw = True
+
+    def snapshot(self):
+        """
+        Return a snapshot of the overworld's tiles (a copy of each loaded
+        chunk's arrays, sprite ids are never reassigned so remain valid).
+        Chunks that haven't changed since they were last snapshot share that
+        snapshot rather than being copied again.
+        """
+        return {key: chunk.snapshot() for key, chunk in self._chunks.items()}
+
+    def render(self, viewport, bounds=None):
+        """
+        Render the overworld, if bounds (top, left, bottom, right) are given
+        only the tiles within them (plus a margin) are rendered.
+        """
+
+        rect = self._get_render_bounds(bounds)
+
+        viewport.clear(z=0)
+        self._render_rect(viewport, self._glyphs.glyphs(), rect)
+
+        self._dirty.clear()
+        self._redraw = False
+        self._glyph_generation = self._glyphs.generation
+        self._rendered = rect
+
+    def render_changes(self, viewport, bounds=None):
+        """
+        Render the tiles changed since the overworld was last rendered, and
+        any scrolled into the given bounds (or all tiles in the bounds if the
+        overworld has been restored or never rendered).
+        """
 
-    def render(self, viewport):
-        """Render the overworld"""
+        glyphs = self._glyphs.glyphs()
 
-        h = self.size[0]
+        if self._redraw or self._glyph_generation != self._glyphs.generation:
+            self.render(viewport, bounds)
+            return
+
+        rect = self._get_render_bounds(bounds)
+        rendered = self._rendered
         w = self.size[1]
 
-        for y in range(h):
-            for x in range(w):
-                self._tiles[y * w + x].render(viewport, y, x)
+        if rect != rendered:
+
+            # Erase the tiles scrolled out of view and render those scrolled
+            # into view.
+            for y, x in cells(rendered, exclude=rect):
+                viewport.erase(y, x, 0)
+
+            for y, x in cells(rect, exclude=rendered):
+                self._render_tile(viewport, glyphs, y * w + x)
+
+            self._rendered = rect
+
+        for tile_index in self._dirty:
+            y, x = divmod(tile_index, w)
+            if not in_bounds(rect, y, x):
+
+                # Rendered if (and when) the tile scrolls into view
+                continue
+
+            self._render_tile(viewport, glyphs, tile_index)
+
+        self._dirty.clear()
+
+    def update_glyph(self, tile_index):
+        """Resolve the glyph for a tile (after one of its layers is set)"""
+
+        chunk, i = self.locate(tile_index)
+        if chunk is None:
+            return
+
+        chunk.tile_glyphs[i] = self.get_glyph_id(
+            chunk.biomes[i],
+            chunk.landmarks[i],
+            chunk.parties[i]
+        )
+        chunk.changed()
+        self._dirty.add(tile_index)
 
     @classmethod
     def from_json_type(cls, json_type):
         """Convert a JSON type object to an `Overworld` instance"""
 
-        size = [json_type['size'][1], json_type['size'][0]]
-        tiles = json_type['tiles']
+        overworld = cls([json_type['size'][1], json_type['size'][0]])
+        overworld.add_chunk({
+            'position': [0, 0],
+            'size': json_type['size'],
+            'tiles': json_type['tiles']
+        })
+
+        return overworld
 
-        overworld = cls(size)
-        for y in range(size[0]):
-            for x in range(size[1]):
+    # Helpers
 
-                tile_index = y * size[1] + x
-                biome, landmark, party = tiles[tile_index]
-                tile = overworld.get_tile(tile_index)
+    def _get_render_bounds(self, bounds):
+        """Return the bounds of the tiles to render (within the overworld)"""
 
-                if biome != -1:
-                    tile.biome = tuple(biome)
+        if bounds is None:
+            return [0, 0, self.size[0] - 1, self.size[1] - 1]
 
-                if landmark != -1:
-                    tile.landmark = tuple(landmark)
+        return clamp_bounds(bounds, settings.ui.viewport_margin, self.size)
 
-                if party != -1:
-                    tile.party = tuple(party)
+    def _render_rect(self, viewport, glyphs, rect):
+        """Render the tiles within the given bounds"""
 
-        return overworld
+        chunk_size = self._chunk_size
+        blit = viewport.blit
+
+        for y in range(rect[0], rect[2] + 1):
+            cy = y // chunk_size
+
+            for cx in range(rect[1] // chunk_size, rect[3] // chunk_size + 1):
+                chunk = self._chunks.get((cy, cx))
+                if chunk is None:
+                    continue
+
+                tile_glyphs = chunk.tile_glyphs
+                i = (y - chunk.y) * chunk.w - chunk.x
+
+                for x in range(
+                    max(rect[1], chunk.x),
+                    min(rect[3], chunk.x + chunk.w - 1) + 1
+                ):
+                    glyph = glyphs[tile_glyphs[i + x]]
+                    if glyph:
+                        blit(y, x, 0, glyph[0], glyph[1])
+
+    def _render_tile(self, viewport, glyphs, tile_index):
+        """Render a single tile"""
+
+        y, x = divmod(tile_index, self._size[1])
+        chunk, i = self.locate(tile_index)
+
+        glyph = glyphs[chunk.tile_glyphs[i]] if chunk else None
+        if glyph:
+            viewport.blit(y, x, 0, glyph[0], glyph[1])
+        else:
+            viewport.erase(y, x, 0)
+
+
+class OverworldChunk:
+    """
+    A (square, or smaller at the edges of the world) chunk of the overworld.
+    """
+
+    def __init__(self, overworld, position, size):
+        self._overworld = overworld
+        self.y, self.x = position
+        self.h, self.w = size
+
+        # An array of sprite ids per layer
+        empty = bytes(2 * self.h * self.w)
+        self.biomes = array.array('H', empty)
+        self.landmarks = array.array('H', empty)
+        self.parties = array.array('H', empty)
+
+        # The glyph id for each tile
+        self.tile_glyphs = array.array('H', empty)
+
+        # The last snapshot of the chunk's tiles (if they haven't changed
+        # since it was taken).
+        self._snapshot = None
+
+    def changed(self):
+        """Mark the chunk's tiles as changed since its last snapshot"""
+        self._snapshot = None
+
+    def load(self, tiles):
+        """Load the chunk's tiles (as sent by the server)"""
+
+        overworld = self._overworld
+        sprite_id = overworld.paths.id
+
+        self.biomes[:] = array.array('H', [sprite_id(t[0]) for t in tiles])
+        self.landmarks[:] = array.array('H', [sprite_id(t[1]) for t in tiles])
+        self.parties[:] = array.array('H', [sprite_id(t[2]) for t in tiles])
+        self.tile_glyphs[:] = array.array(
+            'H',
+            map(
+                overworld.get_glyph_id,
+                self.biomes,
+                self.landmarks,
+                self.parties
+            )
+        )
+        self.changed()
+
+    def restore(self, snapshot):
+        """Restore the chunk's tiles from a snapshot"""
+        (
+            self.biomes[:],
+            self.landmarks[:],
+            self.parties[:],
+            self.tile_glyphs[:]
+        ) = snapshot
+
+        # The snapshot's arrays are copied from (never modified) so the
+        # snapshot remains valid until the chunk next changes.
+        self._snapshot = snapshot
+
+    def snapshot(self):
+        """Return a snapshot of the chunk's tiles"""
+
+        if self._snapshot is None:
+            self._snapshot = (
+                array.array('H', self.biomes),
+                array.array('H', self.landmarks),
+                array.array('H', self.parties),
+                array.array('H', self.tile_glyphs)
+            )
+
+        return self._snapshot
 
 
 class OverworldTile:
     """
-    A tile within the game's overworld.
+    A view of a tile within the game's overworld, tiles within chunks that
+    aren't loaded have nothing in any layer (and can't be set).
     """
 
-    def __init__(self, biome=None, landmark=None, party=None):
+    __slots__ = ('_index', '_overworld')
 
-        self.landmark = landmark
-        self.biome = biome
-        self.party = party
+    def __init__(self, overworld, index):
+        self._overworld = overworld
+        self._index = index
 
     @property
-    def character(self):
-        sprites = SpriteSheet.singleton()
+    def biome(self):
+        return self._get('biomes')
 
-        if self.party:
-            return sprites.get('parties', self.party).character
+    @biome.setter
+    def biome(self, value):
+        self._set('biomes', value)
 
-        if self.landmark:
-            return sprites.get('landmarks', self.landmark).character
+    @property
+    def landmark(self):
+        return self._get('landmarks')
 
-        if self.biome:
-            return sprites.get('biomes', self.biome).character
+    @landmark.setter
+    def landmark(self, value):
+        self._set('landmarks', value)
+
+    @property
+    def party(self):
+        return self._get('parties')
+
+    @party.setter
+    def party(self, value):
+        self._set('parties', value)
+
+    @property
+    def character(self):
+        sprite = self.sprite
+        if sprite:
+            return sprite.character
 
     @property
     def color_pair(self):
+        sprite = self.sprite
+        if sprite:
+            return sprite.color_pair
+
+    @property
+    def glyph(self):
+        """Return the glyph (character, attributes) the tile renders as"""
+
+        chunk, i = self._overworld.locate(self._index)
+        if chunk is not None:
+            return self._overworld.glyphs.glyphs()[chunk.tile_glyphs[i]]
+
+    @property
+    def sprite(self):
+        """Return the sprite for the top most layer of the tile"""
+
         sprites = SpriteSheet.singleton()
 
         if self.party:
-            return sprites.get('parties', self.party).color_pair
+            return sprites.get('parties', self.party)
 
         if self.landmark:
-            return sprites.get('landmarks', self.landmark).color_pair
+            return sprites.get('landmarks', self.landmark)
 
         if self.biome:
-            return sprites.get('biomes', self.biome).color_pair
+            return sprites.get('biomes', self.biome)
 
     def render(self, viewport, y, x):
         """Render the tile"""
 
-        if self.character:
-            viewport.blit(
-                y,
-                x,
-                0,
-                self.character,
-                self.color_pair | curses.A_BOLD
-            )
+        glyph = self.glyph
+        if glyph:
+            viewport.blit(y, x, 0, glyph[0], glyph[1])
+
+    def _get(self, layer):
+        """Return the sprite path for a layer of the tile"""
+
+        chunk, i = self._overworld.locate(self._index)
+        if chunk is not None:
+            return self._overworld.paths.path(getattr(chunk, layer)[i])
+
+    def _set(self, layer, value):
+        """Set the sprite path for a layer of the tile"""
+
+        overworld = self._overworld
+        chunk, i = overworld.locate(self._index)
+        if chunk is None:
+            return
+
+        getattr(chunk, layer)[i] = overworld.paths.id(value)
+        overworld.update_glyph(self._index)
@@ -1,52 +1,111 @@
+import array
 import curses
 import logging
 import math
 
 from game.settings import settings
 from game.utils.colors import Colors
-from game.utils.sprites import SpriteSheet
+from game.utils.rendering import cells, clamp_bounds, in_bounds
+from game.utils.sprites import SpriteGlyphs, SpritePaths, SpriteSheet
 
 
 class Scene:
     """
     The a scene within the game.
+
+    Terrain and scenary (which most tiles have) are stored as dense arrays of
+    interned sprite ids (see `SpritePaths`), items and creatures (which few
+    tiles have) as a sparse index of tile index to a stack of sprite ids, so
+    a tile can hold several of each (e.g a pile of loot). `get_tile` returns
+    a view of a tile.
+
+    As with the overworld the glyph each tile renders as is resolved when the
+    tile is set and held in an array (see `SpriteGlyphs`).
     """
 
     def __init__(self, size):
         self._size = size
-        self._tiles = [SceneTile() for i in range(size[0] * size[1])]
+
+        # Sprite paths used by the scene's tiles (by id)
+        self._paths = SpritePaths()
+
+        # An array of sprite ids per dense layer
+        empty = bytes(2 * size[0] * size[1])
+        self._terrain = array.array('H', empty)
+        self._scenary = array.array('H', empty)
+
+        # A table of sprite id stacks (bottom to top) by tile index for each
+        # sparse layer, tiles with nothing in the layer have no entry.
+        self._items = {}
+        self._creatures = {}
+
+        # The glyph id for each tile
+        self._glyphs = SpriteGlyphs(self._paths)
+        self._tile_glyphs = array.array('H', empty)
+
+        # The indexes of tiles changed since the scene was last rendered, and
+        # a flag indicating that all tiles need to be rendered.
+        self._dirty = set()
+        self._redraw = True
+
+        # The generation of glyphs the scene was last rendered with, and the
+        # bounds of the tiles rendered.
+        self._glyph_generation = None
+        self._rendered = None
+
+    @property
+    def creatures(self):
+        return self._creatures
+
+    @property
+    def glyphs(self):
+        return self._glyphs
+
+    @property
+    def items(self):
+        return self._items
+
+    @property
+    def paths(self):
+        return self._paths
+
+    @property
+    def scenary(self):
+        return self._scenary
 
     @property
     def size(self):
         return list(self._size)
 
+    @property
+    def terrain(self):
+        return self._terrain
+
+    @property
+    def tile_glyphs(self):
+        return self._tile_glyphs
+
     def apply_scene_changes(self, scene_changes):
-        """Apply a set of scene changes to the overworld"""
+        """Apply a set of scene changes to the scene"""
+
+        sprite_id = self._paths.id
+        stack_ids = self._paths.stack_ids
+        terrains = self._terrain
+        scenaries = self._scenary
+        items = self._items
+        creatures = self._creatures
 
         for tile_index, sprites in scene_changes.items():
             terrain, scenary, item, creature = sprites
 
-            tile = self.get_tile(int(tile_index))
-
-            if terrain == -1:
-                tile.terrain = None
-            else:
-                tile.terrain = tuple(terrain)
+            tile_index = int(tile_index)
+            terrains[tile_index] = sprite_id(terrain)
+            scenaries[tile_index] = sprite_id(scenary)
 
-            if scenary == -1:
-                tile.scenary = None
-            else:
-                tile.scenary = tuple(scenary)
+            _set_stack(items, tile_index, stack_ids(item))
+            _set_stack(creatures, tile_index, stack_ids(creature))
 
-            if item == -1:
-                tile.items = None
-            else:
-                tile.items = tuple(item)
-
-            if creature == -1:
-                tile.creatures = None
-            else:
-                tile.creatures = tuple(creature)
+            self.update_glyph(tile_index)
 
     def get_offset(self, yx, size):
         """
@@ -68,101 +127,288 @@ class Scene:
     def get_tile(self, y, x=None):
         """Return a tile either by index or y,x coordinates"""
         if x is None:
-            return self._tiles[y]
-        return self._tiles[y * self._size[1] + x]
+            return SceneTile(self, y)
+        return SceneTile(self, y * self._size[1] + x)
+
+    def restore(self, snapshot):
+        """Restore the scene's tiles from a snapshot"""
 
-    def render(self, viewport):
-        """Render the scene"""
+        terrain, scenary, items, creatures, tile_glyphs = snapshot
 
-        h = self.size[0]
+        self._terrain[:] = terrain
+        self._scenary[:] = scenary
+        self._items = dict(items)
+        self._creatures = dict(creatures)
+        self._tile_glyphs[:] = tile_glyphs
+        self._redraw = True
+
+    def snapshot(self):
+        """
+        Return a snapshot of the scene's tiles (sprite ids are never
+        reassigned and stacks are immutable so stacks are shared with the
+        scene rather than copied).
+        """
+        return (
+            array.array('H', self._terrain),
+            array.array('H', self._scenary),
+            dict(self._items),
+            dict(self._creatures),
+            array.array('H', self._tile_glyphs)
+        )
+
+    def render(self, viewport, bounds=None):
+        """
+        Render the scene, if bounds (top, left, bottom, right) are given only
+        the tiles within them (plus a margin) are rendered.
+        """
+
+        rect = self._get_render_bounds(bounds)
         w = self.size[1]
 
-        for y in range(h):
-            for x in range(w):
-                self._tiles[y * w + x].render(viewport, y, x)
+        glyphs = self._glyphs.glyphs()
+        tile_glyphs = self._tile_glyphs
+        blit = viewport.blit
+
+        viewport.clear(z=0)
+
+        for y in range(rect[0], rect[2] + 1):
+            i = y * w
+            for x in range(rect[1], rect[3] + 1):
+                glyph = glyphs[tile_glyphs[i + x]]
+                if glyph:
+                    blit(y, x, 0, glyph[0], glyph[1])
+
+        self._dirty.clear()
+        self._redraw = False
+        self._glyph_generation = self._glyphs.generation
+        self._rendered = rect
+
+    def render_changes(self, viewport, bounds=None):
+        """
+        Render the tiles changed since the scene was last rendered, and any
+        scrolled into the given bounds (or all tiles in the bounds if the
+        scene has been restored or never rendered).
+        """
+
+        glyphs = self._glyphs.glyphs()
+
+        if self._redraw or self._glyph_generation != self._glyphs.generation:
+            self.render(viewport, bounds)
+            return
+
+        rect = self._get_render_bounds(bounds)
+        rendered = self._rendered
+        w = self.size[1]
+        tile_glyphs = self._tile_glyphs
+
+        if rect != rendered:
+
+            # Erase the tiles scrolled out of view and render those scrolled
+            # into view.
+            for y, x in cells(rendered, exclude=rect):
+                viewport.erase(y, x, 0)
+
+            for y, x in cells(rect, exclude=rendered):
+                glyph = glyphs[tile_glyphs[y * w + x]]
+                if glyph:
+                    viewport.blit(y, x, 0, glyph[0], glyph[1])
+
+            self._rendered = rect
+
+        for tile_index in self._dirty:
+            y, x = divmod(tile_index, w)
+            if not in_bounds(rect, y, x):
+
+                # Rendered if (and when) the tile scrolls into view
+                continue
+
+            glyph = glyphs[tile_glyphs[tile_index]]
+            if glyph:
+                viewport.blit(y, x, 0, glyph[0], glyph[1])
+            else:
+                viewport.erase(y, x, 0)
+
+        self._dirty.clear()
+
+    def update_glyph(self, tile_index):
+        """Resolve the glyph for a tile (after one of its layers is set)"""
+        self._tile_glyphs[tile_index] = self._get_glyph_id(tile_index)
+        self._dirty.add(tile_index)
 
     @classmethod
     def from_json_type(cls, json_type):
-        """Convert a JSON type object to an `Overworld` instance"""
+        """Convert a JSON type object to a `Scene` instance"""
 
         size = [json_type['size'][1], json_type['size'][0]]
         tiles = json_type['tiles']
 
         scene = cls(size)
-        for y in range(size[0]):
-            for x in range(size[1]):
+        sprite_id = scene._paths.id
+        stack_ids = scene._paths.stack_ids
+
+        scene._terrain[:] = array.array(
+            'H',
+            [sprite_id(t[0]) for t in tiles]
+        )
+        scene._scenary[:] = array.array(
+            'H',
+            [sprite_id(t[1]) for t in tiles]
+        )
+
+        for tile_index, tile in enumerate(tiles):
+            if tile[2] != -1:
+                _set_stack(scene._items, tile_index, stack_ids(tile[2]))
+
+            if tile[3] != -1:
+                _set_stack(scene._creatures, tile_index, stack_ids(tile[3]))
+
+        # Resolve the glyphs for the terrain and scenary layers in bulk (per
+        # sprite rather than per tile) then resolve those of the few tiles
+        # with items or creatures on top.
+        glyph_id = scene._glyphs.id
+        terrain_glyphs = {
+            t: glyph_id('terrain', t) for t in set(scene._terrain)
+        }
+        scenary_glyphs = {
+            s: glyph_id('scenary', s) for s in set(scene._scenary)
+        }
+
+        scene._tile_glyphs[:] = array.array(
+            'H',
+            [
+                scenary_glyphs[s] or terrain_glyphs[t]
+                for t, s in zip(scene._terrain, scene._scenary)
+            ]
+        )
+
+        for tile_index in scene._items.keys() | scene._creatures.keys():
+            scene._tile_glyphs[tile_index] = scene._get_glyph_id(tile_index)
+
+        # A new scene is rendered in full so no tiles are marked as changed
+        return scene
 
-                tile_index = y * size[1] + x
-                terrain, scenary, items, creatures = tiles[tile_index]
-                tile = scene.get_tile(tile_index)
+    # Helpers
 
-                if terrain != -1:
-                    tile.terrain = tuple(terrain)
+    def _get_glyph_id(self, tile_index):
+        """Return the glyph id for a tile's top most layer"""
 
-                if scenary != -1:
-                    tile.scenary = tuple(scenary)
+        glyph_id = self._glyphs.id
 
-                if items != -1:
-                    tile.items = tuple(items)
+        stack = self._creatures.get(tile_index)
+        if stack:
+            return glyph_id('creatures', stack[-1])
 
-                if creatures != -1:
-                    tile.creatures = tuple(creatures)
+        stack = self._items.get(tile_index)
+        if stack:
+            return glyph_id('items', stack[-1])
 
-        return scene
+        if self._scenary[tile_index]:
+            return glyph_id('scenary', self._scenary[tile_index])
+
+        return glyph_id('terrain', self._terrain[tile_index])
+
+    def _get_render_bounds(self, bounds):
+        """Return the bounds of the tiles to render (within the scene)"""
+
+        if bounds is None:
+            return [0, 0, self.size[0] - 1, self.size[1] - 1]
+
+        return clamp_bounds(bounds, settings.ui.viewport_margin, self.size)
 
 
 class SceneTile:
     """
-    A tile within the scene.
+    A view of a tile within the scene.
     """
 
-    def __init__(self, terrain=None, scenary=None, items=None, creatures=None):
+    __slots__ = ('_index', '_scene')
 
-        self.terrain = terrain
-        self.scenary = scenary
-        self.items = items
-        self.creatures = creatures
+    def __init__(self, scene, index):
+        self._scene = scene
+        self._index = index
 
     @property
-    def character(self):
-        sprites = SpriteSheet.singleton()
+    def creature(self):
+        """The top most creature on the tile"""
+        creatures = self.creatures
+        if creatures:
+            return creatures[-1]
 
-        if self.creatures:
-            return sprites.get('creatures', self.creatures).character
+    @property
+    def creatures(self):
+        scene = self._scene
+        return scene.paths.stack(scene.creatures.get(self._index, ()))
 
-        if self.items:
-            return sprites.get('items', self.items).character
+    @property
+    def item(self):
+        """The top most item on the tile"""
+        items = self.items
+        if items:
+            return items[-1]
 
-        if self.scenary:
-            return sprites.get('scenary', self.scenary).character
+    @property
+    def items(self):
+        scene = self._scene
+        return scene.paths.stack(scene.items.get(self._index, ()))
 
-        if self.terrain:
-            return sprites.get('terrain', self.terrain).character
+    @property
+    def scenary(self):
+        scene = self._scene
+        return scene.paths.path(scene.scenary[self._index])
+
+    @property
+    def terrain(self):
+        scene = self._scene
+        return scene.paths.path(scene.terrain[self._index])
+
+    @property
+    def character(self):
+        sprite = self.sprite
+        if sprite:
+            return sprite.character
 
     @property
     def color_pair(self):
+        sprite = self.sprite
+        if sprite:
+            return sprite.color_pair
+
+    @property
+    def glyph(self):
+        """Return the glyph (character, attributes) the tile renders as"""
+        scene = self._scene
+        return scene.glyphs.glyphs()[scene.tile_glyphs[self._index]]
+
+    @property
+    def sprite(self):
+        """Return the sprite for the top most layer of the tile"""
+
         sprites = SpriteSheet.singleton()
 
-        if self.creatures:
-            return sprites.get('creatures', self.creatures).color_pair
+        if self.creature:
+            return sprites.get('creatures', self.creature)
 
-        if self.items:
-            return sprites.get('items', self.items).color_pair
+        if self.item:
+            return sprites.get('items', self.item)
 
         if self.scenary:
-            return sprites.get('scenary', self.scenary).color_pair
+            return sprites.get('scenary', self.scenary)
 
         if self.terrain:
-            return sprites.get('terrain', self.terrain).color_pair
+            return sprites.get('terrain', self.terrain)
 
     def render(self, viewport, y, x):
         """Render the tile"""
 
-        if self.character:
-            viewport.blit(
-                y,
-                x,
-                0,
-                self.character,
-                self.color_pair | curses.A_BOLD
-            )
+        glyph = self.glyph
+        if glyph:
+            viewport.blit(y, x, 0, glyph[0], glyph[1])
+
+
+def _set_stack(layer, tile_index, stack):
+    """Set (or clear if empty) the stack for a tile in a sparse layer"""
+
+    if stack:
+        layer[tile_index] = stack
+    else:
+        layer.pop(tile_index, None)
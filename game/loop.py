@@ -7,7 +7,7 @@ import time
 import traceback
 
 from game.clients.blocking import BlockingClient
-from game.clients.non_blocking import NonBlockingClient
+from game.clients.prefetch import Prefetcher
 from game.settings import settings
 from game import states
 from game.states.manager import GameStateManager
@@ -15,6 +15,9 @@ from game.ui.busy import Busy
 from game.ui.component import Component
 from game.ui.console import Console
 from game.utils.colors import Colors
+from game.utils.frame_log import FrameLog
+from game.utils.frames import FrameStore, LazyFrame
+from game.utils.headless import HeadlessWindow, init_acs_chars
 from game.utils.sprites import SpriteSheet
 
 
@@ -23,10 +26,18 @@ class GameLoop:
     The game loop is responsible for executing the game's logic continuously.
     """
 
-    def init(self):
-        """Initialize key systems for the game"""
+    def init(self, headless=False, screen_size=(40, 120)):
+        """
+        Initialize key systems for the game. In headless mode the game renders
+        to an offscreen window (of the given screen size) instead of the
+        terminal and the game loop runs as fast as it can.
+        """
 
         self.quit = False
+        self._headless = headless
+
+        # The number of iterations of the game loop run
+        self.iterations = 0
 
         # Setup a log file for the game
         logging.basicConfig(
@@ -36,27 +47,56 @@ class GameLoop:
         logging.getLogger('asyncio').setLevel(logging.WARNING)
 
         # Set up the screen
-        self._screen = curses.initscr()
-        curses.noecho()
-        curses.cbreak()
-        curses.curs_set(False)
-        curses.start_color()
+        if headless:
+            self._screen = HeadlessWindow(*screen_size)
+            init_acs_chars()
+
+        else:
+            self._screen = curses.initscr()
+            curses.noecho()
+            curses.cbreak()
+            curses.curs_set(False)
+            curses.start_color()
 
         # These two numbers indicate the last frame we have stored in the
         # client vs. the last frame on the server.
         self._client_frame_no = -1
         self._server_frame_no = 0
 
-        # A table of frames received from the server
-        self._frames = {}
+        # A store of the frames received from the server (bounded to the
+        # frames the game states could still need), optionally backed by a
+        # log of every frame received.
+        frame_log = None
+        if settings.game.frame_log:
+            frame_log = FrameLog(
+                time.strftime('logs/frames-%Y%m%d-%H%M%S', time.localtime())
+            )
+
+        self._frames = FrameStore(
+            settings.game.max_frame_lag + settings.game.frame_store_margin,
+            frame_log
+        )
+
+        # The client used to communicate with the game server, and a cache of
+        # responses the game states have requested ahead of time.
+        self._client = None
+        self._prefetcher = None
 
         # Flag indicating if peek should be forced to execute ahead of the
         # standard frame delay.
         self._force_peek = False
 
+        # Flag indicating if the server is streaming frames to the client, if
+        # not we fall back to peeking for new frames.
+        self._subscribed = False
+
+        # Flag indicating if we've joined the game (and so should rejoin if
+        # the connection to the server is lost).
+        self._joined = False
+
     @property
     def client(self):
-        return self._blocking_client
+        return self._client
 
     @property
     def frame_no(self):
@@ -66,10 +106,18 @@ class GameLoop:
     def frames(self):
         return self._frames
 
+    @property
+    def headless(self):
+        return self._headless
+
     @property
     def main_window(self):
         return self._main_window
 
+    @property
+    def prefetcher(self):
+        return self._prefetcher
+
     @property
     def screen(self):
         return self._screen
@@ -90,16 +138,20 @@ class GameLoop:
     def ui_root(self):
         return self._ui_root
 
-    async def run(self):
+    async def run(self, max_iterations=None):
 
         try:
             # Set up the main window for the game
-            self._main_window = curses.newwin(*self.screen.getmaxyx(), 0, 0)
+            if self._headless:
+                self._main_window = self.screen.derwin(0, 0)
+            else:
+                self._main_window = curses.newwin(*self.screen.getmaxyx(), 0, 0)
+
             self._main_window.nodelay(True)
             self._main_window.keypad(True)
 
             # Initialize the game's color palette
-            Colors.init()
+            Colors.init(headless=self._headless)
             self._main_window.bkgd(
                 ' ',
                 Colors.pair(settings.ui.fg_color, settings.ui.bg_color)
@@ -120,13 +172,28 @@ class GameLoop:
             # Set up the game state manager
             self._state_manager = GameStateManager(self)
 
-            # Create a client and attempt to connect to the game server
-            self._blocking_client = BlockingClient()
-            self._non_blocking_client = NonBlockingClient()
+            # Create a client and attempt to connect to the game server, a
+            # single connection is shared by blocking calls (made by states)
+            # and non-blocking calls (made by the game loop).
+            self._client = BlockingClient()
+            self._prefetcher = Prefetcher(
+                self._client,
+                settings.game.prefetch_limit
+            )
+
+            # If the connection is lost and re-established, resume from the
+            # last frame we received.
+            loop = asyncio.get_running_loop()
+            self._client.client.add_push_listener(
+                'reconnected',
+                lambda push: loop.call_soon_threadsafe(self.on_reconnected)
+            )
 
             try:
-                self._blocking_client.connect()
-                await self._non_blocking_client.connect()
+                self._client.connect()
+
+                # Ask the server to stream frames to us
+                self.subscribe_frames()
 
                 # Set the initial game state
                 self._state_manager.push('join_game')
@@ -153,6 +220,7 @@ class GameLoop:
                 )
 
             # Run the game loop
+            reconnecting = False
             peek_task = None
             last_peek_time = time.time() - 1
             last_loop_time = time.time()
@@ -160,10 +228,15 @@ class GameLoop:
                 self._ui_console.clear()
 
                 char = self.main_window.getch()
-                curses.flushinp()
+
+                if not self._headless:
+                    curses.flushinp()
 
                 if char == curses.ERR:
-                    await asyncio.sleep(0.1)
+
+                    # When headless we only yield to other tasks so the loop
+                    # runs at maximum speed.
+                    await asyncio.sleep(0 if self._headless else 0.1)
 
                 elif char == curses.KEY_RESIZE:
                     self.on_resize()
@@ -173,18 +246,30 @@ class GameLoop:
                     self._state_manager.input(char)
 
                 dt = time.time() - last_loop_time
+                last_loop_time = time.time()
                 self._state_manager.update(dt)
+
+                # Show live client/frame store stats in the dev console
+                if self._ui_console.enabled:
+                    self.log_client_stats(self._ui_console.height - 1)
+                    self._ui_console.log(
+                        'frames',
+                        f'{len(self._frames)} stored '
+                        f'({self._frames.memory_usage() / 1024:.0f}KB)'
+                    )
+
                 self._ui_console.update(dt)
 
                 self.main_window.erase()
                 self._state_manager.render()
 
-                if self._non_blocking_client.connected:
+                if self._client.connected and not self._subscribed:
 
                     if (
-                        not peek_task or peek_task.done()
+                        (not peek_task or peek_task.done())
                         and (
-                            last_peek_time > 1
+                            time.time() - last_peek_time
+                                > settings.game.peek_interval
                             or self._force_peek
                         )
                     ):
@@ -194,10 +279,20 @@ class GameLoop:
                         last_peek_time = time.time()
                         self._force_peek = False
 
+                # Let the player know if we've lost our connection
+                if reconnecting != self._client.reconnecting:
+                    reconnecting = self._client.reconnecting
+                    self._ui_busy.visible = reconnecting
+                    self._ui_busy.message = 'Reconnecting...'
+
                 # NOTE: Must be the last lines in the loop
                 self._ui_busy.render(self.main_window)
                 self._ui_console.render(self.main_window)
 
+                self.iterations += 1
+                if max_iterations and self.iterations >= max_iterations:
+                    self.quit = True
+
 
         finally:
             self.cleanup()
@@ -205,20 +300,115 @@ class GameLoop:
     async def peek(self):
         """Peek at the current frame number on the server"""
         self._server_frame_no \
-                = (await self._non_blocking_client.send('peek'))['frame_no']
+                = (await self.send_async('peek'))['frame_no']
 
         # If the server frame number is now greater than the client frame
         # number fetch the frames that have elapsed.
 
         if self._client_frame_no < self._server_frame_no:
 
-            new_frames = (await self._non_blocking_client.send(
+            new_frames = (await self.send_async(
                 'get_frames',
-                {'frame_no': self._client_frame_no + 1}
+                {'frame_no': self._client_frame_no + 1, 'encoded': True}
             ))['frames']
 
-            self._frames.update({f[0]: f[1] for f in new_frames})
-            self._client_frame_no = self._server_frame_no
+            self.store_frames(new_frames)
+            self._client_frame_no = max(
+                self._client_frame_no,
+                self._server_frame_no
+            )
+
+    def join_game(self):
+        """Join the game on the server, returns the server's response"""
+
+        response = self._client.send('game:join')
+        self._joined = bool(response.get('joined'))
+
+        return response
+
+    async def resume_frames(self):
+        """
+        Rejoin the game (if we'd joined it) as the server may have removed us
+        from the party when the connection was lost, then fetch the frames
+        missed while disconnected from the server (in a single request) and
+        resume streaming frames if we were subscribed.
+        """
+
+        if self._joined:
+            response = await self.send_async('game:join')
+            if not response.get('joined'):
+                logging.warning(
+                    f'Failed to rejoin the game: {response.get("reason")}'
+                )
+
+        response = await self.send_async(
+            'get_frames',
+            {'frame_no': self._client_frame_no + 1, 'encoded': True}
+        )
+        self.store_frames(response['frames'])
+
+        if self._subscribed:
+            response = await self.send_async(
+                'subscribe_frames',
+                {'frame_no': self._client_frame_no + 1, 'encoded': True}
+            )
+            self._subscribed = bool(response.get('subscribed'))
+
+    def store_frames(self, frames, codec=None):
+        """
+        Store frames (a list of [frame_no, frame]) received from the server,
+        frames sent encoded (see the `encoded` flag for `get_frames`), or
+        with only their scene changes encoded, are stored as is and decoded
+        when first accessed.
+        """
+
+        codec = codec or self._client.client.codec
+
+        for frame_no, frame in frames:
+
+            if (
+                isinstance(frame, (bytes, str))
+                or isinstance(frame.get('scene_changes'), (bytes, str))
+            ):
+                frame = LazyFrame(frame, codec)
+
+            self._frames.add(frame_no, frame)
+            self._client_frame_no = max(self._client_frame_no, frame_no)
+            self._server_frame_no = max(self._server_frame_no, frame_no)
+
+    def subscribe_frames(self):
+        """
+        Ask the server to stream new frames to the client as they are
+        produced, if the server doesn't support this the game loop will peek
+        for new frames instead.
+        """
+
+        # Frames are pushed on the client's IO thread so we hand them over to
+        # the game loop's thread to store (along with the codec they were
+        # encoded with).
+        loop = asyncio.get_running_loop()
+        self._client.client.add_push_listener(
+            'frames',
+            lambda push: loop.call_soon_threadsafe(
+                self.store_frames,
+                push['frames'],
+                self._client.client.codec
+            )
+        )
+
+        # Ask for frames to be sent encoded so we only decode those we use
+        try:
+            response = self._client.send(
+                'subscribe_frames',
+                {'frame_no': self._client_frame_no + 1, 'encoded': True},
+                timeout=5
+            )
+            self._subscribed = bool(response.get('subscribed'))
+
+        except TimeoutError:
+            self._subscribed = False
+
+        logging.info(f'Subscribed to frames: {self._subscribed}')
 
     def bootstrap(self, message, task, hide_on_done=True):
         """Present a message to the user while performing a synchronous task"""
@@ -237,6 +427,15 @@ class GameLoop:
     def cleanup(self):
         """Clean up before exiting the game"""
 
+        if self._client:
+            self._client.close()
+
+        if self._frames.log is not None:
+            self._frames.log.close()
+
+        if self._headless:
+            return
+
         self.screen.keypad(False)
         curses.curs_set(True)
         curses.nocbreak()
@@ -246,6 +445,12 @@ class GameLoop:
     def force_peek(self):
         self._force_peek = True
 
+    async def send_async(self, message_type, message=None):
+        """Send a message to the game server without blocking the game loop"""
+        return await asyncio.wrap_future(
+            self._client.submit(message_type, message)
+        )
+
     def hide_bootstrap(self):
         """
         Hide the bootstap message being displayed, useful if you are making
@@ -262,6 +467,39 @@ class GameLoop:
 
     # Event handlers
 
+    def log_client_stats(self, limit):
+        """
+        Log stats for the message types the client has sent the most of
+        (round trip times, sizes, etc.) to the dev console, up to the given
+        limit of message types.
+        """
+
+        # Compression totals (once negotiated) take one line of the limit
+        compression = self._client.compression
+        if compression.enabled:
+            self._ui_console.log('compression', compression.stats.summary())
+            limit -= 1
+
+        stats = sorted(
+            self._client.stats.snapshot().values(),
+            key=lambda s: s.sent + s.received,
+            reverse=True
+        )
+
+        for message_stats in stats[:limit]:
+            self._ui_console.log(
+                message_stats.message_type,
+                message_stats.summary()
+            )
+
+    def on_reconnected(self):
+        """Handle the client reconnecting to the server"""
+
+        # Requests in flight when the connection was lost will have failed
+        self._prefetcher.clear()
+
+        asyncio.ensure_future(self.resume_frames())
+
     def on_resize(self):
         """Handle the console being resized"""
 
@@ -277,7 +515,6 @@ class GameLoop:
 #   check response and if not a valid connection raise an error we can
 #   capture in-game and deal with (e.g unable to connect to game server please
 #   check your settings).
-# - Handle auto-reconnections
 # - Plan how we will join a game through the client.
 # - Create a bootstrap state?
 #
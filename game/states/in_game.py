@@ -26,6 +26,7 @@ class InGame(GameState):
         self.in_scene = kw.get('in_scene', False)
         if self.in_scene:
             self.active_player = kw['active_player']
+            self.scene_position = kw.get('position')
 
     def resume(self, **kw):
         super().resume(**kw)
@@ -33,6 +34,7 @@ class InGame(GameState):
         self.in_scene = kw.get('in_scene', False)
         if self.in_scene:
             self.active_player = kw['active_player']
+            self.scene_position = kw.get('position')
 
     def leave(self):
         super().leave()
@@ -49,7 +51,8 @@ class InGame(GameState):
         if self.in_scene:
             self.game_state_manager.push(
                 'scene',
-                active_player=self.active_player
+                active_player=self.active_player,
+                position=self.scene_position
             )
 
         else:
@@ -55,5 +55,5 @@ class JoinGame(GameState):
 
     def join(self):
         """Attempt to join the game on the server"""
-        response = self.game.client.send('game:join')
+        response = self.game.join_game()
         return (response['joined'], response.get('reason', ''))
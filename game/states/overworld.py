@@ -6,8 +6,10 @@ from game.settings import settings
 from game.states.state import GameState
 from game.ui.border import Border
 from game.utils.colors import Colors
+from game.utils.frames import KeyframeIndex, compact_frames
 from game.utils.input import key_pressed
-from game.utils.rendering import Viewport
+from game.utils.rendering import Viewport, get_bounds
+from game.utils.replay import ReplayScheduler
 
 
 class Overworld(GameState):
@@ -24,7 +26,31 @@ class Overworld(GameState):
         self.overworld = None
         self.party = None
         self.last_frame_no = -1
-        self.replay_dt = 0
+
+        # Whether the overworld is loaded in chunks (if the server supports
+        # it) and the chunk the party was last in.
+        self.chunked = False
+        self.party_chunk = None
+
+        # The party's last known position and the direction it was last
+        # heading in (used to predict what to prefetch).
+        self.party_yx = None
+        self.heading = (0, 0)
+
+        # Paces the replay of frames when we're behind the current frame
+        self.replay = ReplayScheduler(
+            settings.game.replay_frame_rate,
+            settings.game.max_frame_lag,
+            settings.game.replay_max_speed
+        )
+
+        # Periodic snapshots of the overworld allowing us to seek to a frame,
+        # and a flag indicating we've rewound and are replaying frames.
+        self.keyframes = KeyframeIndex(
+            settings.game.keyframe_interval,
+            settings.game.max_keyframes
+        )
+        self.rewinding = False
 
         # A viewport to render the game world within
         self.viewport = Viewport()
@@ -41,10 +67,20 @@ class Overworld(GameState):
             lambda: self.fetch_overworld()
         )
 
+    def leave(self):
+        super().leave()
+
+        # Stop holding frames for the state
+        self.game.frames.release(self.ID)
+
     def input(self, char):
         super().input(char)
 
-        if not self.party.i_am_leader:
+        if key_pressed(f'controls.rewind', char):
+            self.rewind(settings.game.rewind_frames)
+
+        # The party can't be moved while we're showing it in the past
+        if not self.party.i_am_leader or self.rewinding:
             return
 
         if key_pressed(f'controls.enter_scene', char):
@@ -62,6 +98,10 @@ class Overworld(GameState):
 
         self.sync_frame(dt)
 
+        if self.status != self.READY:
+            self.load_chunks()
+            self.prefetch()
+
     def render(self):
 
         if self.paused:
@@ -74,17 +114,25 @@ class Overworld(GameState):
         # Clear dynamic layer for viewport
         self.viewport.clear(z=1)
 
-        # Render the dynamic elements within the overworld
-        self.overworld.render(self.viewport)
-
-        # Draw the viewport's content
         viewport_rect = [2, 1, max_y - 9, max_x - 3]
+        offset = self.overworld.get_offset(
+            self.party.yx,
+            [max_y - 8, max_x - 4]
+        )
 
+        # Render the tiles that have changed (or scrolled into view) within
+        # the overworld
+        self.overworld.render_changes(
+            self.viewport,
+            get_bounds(offset, viewport_rect[2:])
+        )
+
+        # Draw the viewport's content
         self.viewport.render(
             ctx,
             viewport_rect[0:2],
             viewport_rect[2:],
-            self.overworld.get_offset(self.party.yx, [max_y - 8, max_x - 4])
+            offset
         )
 
         # Update the size of the border to wrap the viewport
@@ -99,6 +147,47 @@ class Overworld(GameState):
         response = self.game.client.send('party:enter_scene')
         self.party.leader = None
 
+    def load_chunks(self):
+        """
+        Load any chunks of the overworld around the party that aren't loaded
+        and evict chunks far from the party.
+        """
+
+        if not self.chunked:
+            return
+
+        chunk = self.overworld.get_chunk_key(self.party.y, self.party.x)
+        if chunk == self.party_chunk:
+            return
+
+        self.party_chunk = chunk
+
+        keys = self.overworld.get_chunk_keys(
+            self.party.y,
+            self.party.x,
+            settings.game.chunk_load_radius
+        )
+
+        # Use any chunks we've prefetched and read the rest
+        unfetched = []
+        for key in keys:
+            if self.overworld.has_chunk(key):
+                continue
+
+            # Don't wait on a prefetch still in flight, the chunk is read
+            # (along with any others not prefetched) instead.
+            chunk = self.game.prefetcher.take(('chunk', key), timeout=0)
+            if chunk:
+                self.overworld.add_chunk(chunk)
+            else:
+                unfetched.append(key)
+
+        if unfetched:
+            for chunk in self.read_chunks(unfetched):
+                self.overworld.add_chunk(chunk)
+
+        self.overworld.evict_chunks(settings.game.max_chunks, set(keys))
+
     def move_party(self, direction):
         """Move the party in the given direction"""
         response = self.game.client.send('move', {'direction': direction})
@@ -109,10 +198,50 @@ class Overworld(GameState):
             self.party.y = response['position'][1]
             self.overworld.apply_scene_changes(response['scene_changes'])
 
-    def move_to_frame_no(self, frame):
-        """Move to the given frame within the overworld"""
+    def fast_forward(self, frame_no):
+        """
+        Move forward to the given frame within the overworld. The frames
+        passed are compacted (e.g a run of party moves becomes a single move)
+        so that catching up costs one apply rather than one per frame, the
+        tiles changed are rendered on the next render.
+        """
+
+        frames = []
+        while self.last_frame_no < frame_no:
+            self.last_frame_no += 1
+            frame = self.get_frame(self.last_frame_no)
+
+            # Only the party's frames change the overworld, other frames are
+            # passed without decoding their scene changes.
+            if frame and frame.get('actor') == 'party':
+                frames.append(frame)
+
+        for frame in compact_frames(frames):
+            self.apply_frame(frame)
+
+            # Stop if the frame transitioned us out of the overworld
+            if self.status == self.READY:
+                return
+
+    def get_frame(self, frame_no):
+        """Return the given frame (and let the frame store release it)"""
+
+        frame = self.game.frames.get_lazy(frame_no)
+
+        # Let the frame store know it no longer needs to keep the frame
+        self.game.frames.consume(self.ID, frame_no)
+
+        if frame is None:
+
+            # The frame was never received (or has been evicted)
+            logging.warning(f'Missing frame: {frame_no}')
+
+        return frame
 
-        frame = self.game.frames[self.last_frame_no]
+    def apply_frame(self, frame):
+        """Apply a frame's changes to the overworld (without rendering)"""
+
+        self.apply_changes(frame)
 
         actor = frame.get('actor')
         action = frame.get('action')
@@ -123,13 +252,13 @@ class Overworld(GameState):
 
             if action == 'move':
 
-                # Move the party to the position they are in for this frame
-                self.party.x = data['position'][0]
-                self.party.y = data['position'][1]
-
-                # Update the overworld with any scene changes
-                self.overworld.apply_scene_changes(scene_changes)
-                self.overworld.render(self.viewport)
+                # A chunk prefetched before a change to it is out of date
+                for tile_index in scene_changes:
+                    key = self.overworld.get_chunk_key(
+                        *divmod(int(tile_index), self.overworld.size[1])
+                    )
+                    if key not in self.overworld:
+                        self.game.prefetcher.discard(('chunk', key))
 
             elif frame.get('action') == 'enter_scene':
 
@@ -137,18 +266,174 @@ class Overworld(GameState):
                 # state.
                 self.game_state_manager.pop(
                     active_player=data['active_player'],
-                    in_scene=True
+                    in_scene=True,
+                    position=[self.party.x, self.party.y]
                 )
 
+    def apply_changes(self, frame):
+        """
+        Apply only the changes a frame makes to the overworld and party (no
+        transitions, e.g into a scene), as when seeking.
+        """
+
+        data = frame.get('data')
+
+        if frame.get('actor') == 'party' and frame.get('action') == 'move':
+
+            # Move the party to the position they are in for this frame
+            self.party.x = data['position'][0]
+            self.party.y = data['position'][1]
+
+            # Update the overworld with any scene changes
+            self.overworld.apply_scene_changes(frame.get('scene_changes'))
+
+    def rewind(self, frames):
+        """
+        Show the overworld as it was the given number of frames ago (or as
+        near to it as the frames held allow) and replay the frames since.
+        Returns False if we can't rewind.
+        """
+
+        frame_no = max(0, self.last_frame_no - frames)
+        frame_nos = [frame_no] + [
+            n for n in self.keyframes.frame_nos
+            if frame_no < n < self.last_frame_no
+        ]
+
+        for frame_no in frame_nos:
+            if self.seek(frame_no):
+                self.rewinding = True
+                self.replay.reset()
+                return True
+
+        return False
+
+    def seek(self, frame_no):
+        """
+        Show the overworld as it was at the given frame, the overworld is
+        restored from the nearest keyframe and the frames since applied.
+        Returns False if the frame can't be reconstructed (the frames required
+        are no longer held).
+        """
+
+        keyframe = self.keyframes.nearest(frame_no)
+        if keyframe is None:
+            return False
+
+        keyframe_no, (snapshot, x, y) = keyframe
+
+        frames = [
+            self.game.frames.get_lazy(n)
+            for n in range(keyframe_no + 1, frame_no + 1)
+        ]
+        if None in frames:
+            return False
+
+        self.overworld.restore(snapshot)
+        self.party.x = x
+        self.party.y = y
+
+        for frame in compact_frames(frames):
+            self.apply_changes(frame)
+
+        # The chunks loaded may no longer be those around the party
+        self.party_chunk = None
+
+        self.last_frame_no = frame_no
+        self.game.frames.consume(self.ID, frame_no)
+
+        return True
+
+    def prefetch(self):
+        """
+        Prefetch the chunks the party is heading towards and the scenes of
+        any landmarks (e.g caves) next to the party in the background.
+        """
+
+        yx = (self.party.y, self.party.x)
+        if yx == self.party_yx:
+            return
+
+        if self.party_yx:
+            dy = yx[0] - self.party_yx[0]
+            dx = yx[1] - self.party_yx[1]
+            self.heading = ((dy > 0) - (dy < 0), (dx > 0) - (dx < 0))
+
+        self.party_yx = yx
+
+        overworld = self.overworld
+        prefetcher = self.game.prefetcher
+        h, w = overworld.size
+
+        # Prefetch the chunks we'll need once the party reaches the next
+        # chunk in the direction it's heading.
+        if self.chunked and self.heading != (0, 0):
+            chunk_size = overworld.chunk_size
+            keys = overworld.get_chunk_keys(
+                max(0, min(h - 1, yx[0] + self.heading[0] * chunk_size)),
+                max(0, min(w - 1, yx[1] + self.heading[1] * chunk_size)),
+                settings.game.chunk_load_radius
+            )
+
+            for key in keys:
+                if key not in overworld:
+                    prefetcher.prefetch(
+                        ('chunk', key),
+                        'world:read_chunk',
+                        self.get_chunk_message(key)
+                    )
+
+        # Prefetch the scenes of any landmarks the party is on or next to,
+        # along with the player (who we'll need on entering the scene).
+        for y in range(max(0, yx[0] - 1), min(h, yx[0] + 2)):
+            for x in range(max(0, yx[1] - 1), min(w, yx[1] + 2)):
+                if overworld.get_tile(y, x).landmark:
+                    if prefetcher.prefetch(
+                        ('scene', x, y),
+                        'scene:read',
+                        {'position': [x, y]}
+                    ):
+                        prefetcher.discard(('player',))
+                        prefetcher.prefetch(('player',), 'player:read')
+
+    def get_chunk_message(self, key):
+        """Return the `world:read_chunk` message for a chunk (by key)"""
+
+        chunk_size = settings.game.chunk_size
+        return {
+            'position': [key[1] * chunk_size, key[0] * chunk_size],
+            'size': [chunk_size, chunk_size]
+        }
+
+    def read_chunks(self, keys):
+        """Read chunks of the overworld (by chunk key) from the server"""
+        return self.game.client.batch([
+            ('world:read_chunk', self.get_chunk_message(key))
+            for key in keys
+        ])
+
+    def take_keyframe(self):
+        """Take a keyframe of the overworld (and party) at the last frame"""
+        self.keyframes.add(
+            self.last_frame_no,
+            (self.overworld.snapshot(), self.party.x, self.party.y)
+        )
+
     def sync_frame(self, dt):
         """Sync view to the current frame"""
 
-        if self.party.i_am_leader:
+        if self.party.i_am_leader and not self.rewinding:
 
             # If we are the party leader then our party is already in the
             # correct position (as we are the only one who can move it) so
-            # just sync the frame no.
+            # just sync the frame no (unless we've rewound, in which case the
+            # frames since are replayed as for any other player).
             self.last_frame_no = self.game.frame_no
+            self.game.frames.consume(self.ID, self.last_frame_no)
+
+            if self.keyframes.due(self.last_frame_no):
+                self.take_keyframe()
+
             return
 
         # We are not the party leader and therefore the sync is passive and may
@@ -159,48 +444,88 @@ class Overworld(GameState):
             # When the player first enters the overworld we always show the
             # most recent frame (no catch up on entering the overworld).
             self.last_frame_no = self.game.frame_no
+            self.game.frames.consume(self.ID, self.last_frame_no)
 
         max_frame_lag = settings.game.max_frame_lag
-        if self.last_frame_no < (self.game.frame_no - max_frame_lag):
+        if (
+            not self.rewinding
+            and self.last_frame_no < (self.game.frame_no - max_frame_lag)
+        ):
 
             # Don't allow the player to lag too far behind the current game
             # frame.
+            self.fast_forward(self.game.frame_no - max_frame_lag)
 
-            while self.last_frame_no < (self.game.frame_no - max_frame_lag):
-
-                # Increment the frame by one
-                self.last_frame_no += 1
-
-                # Apply the frame
-                self.move_to_frame_no(self.last_frame_no)
+            if self.status == self.READY:
+                return
 
         if self.last_frame_no < self.game.frame_no:
 
             # The player is currently behind the most recent game frame so
-            # replay past frames to catch up.
-            self.replay_dt += dt
+            # replay past frames to catch up (faster the further behind).
+            frames = self.replay.advance(
+                dt,
+                self.game.frame_no - self.last_frame_no
+            )
 
-            if self.replay_dt > 1 / settings.game.replay_frame_rate:
+            if frames:
+                self.fast_forward(self.last_frame_no + frames)
+
+        # Take a keyframe (unless the frame took us out of the overworld)
+        if self.status == self.READY:
+            return
 
-                # Increment the frame by one
-                self.last_frame_no += 1
+        if self.last_frame_no >= self.game.frame_no:
+            self.rewinding = False
 
-                # Apply the frame
-                self.move_to_frame_no(self.last_frame_no)
+        if self.keyframes.due(self.last_frame_no):
+            self.take_keyframe()
 
     # Bootstraps
 
     def fetch_overworld(self):
-        """Fetch the overworld from the server"""
-        self.overworld = entities.overworld.Overworld.from_json_type(
-            self.game.client.send('world:read')
-        )
-
-        self.party = entities.party.Party.from_json_type(
-            self.game.client.send('party:read')
-        )
+        """
+        Fetch the overworld from the server, the chunks around the party are
+        fetched unless the server doesn't support reading chunks in which
+        case the whole world is.
+        """
+
+        # Read the party along with a single tile of the overworld, which
+        # tells us the size of the overworld (so we only ask for chunks
+        # within it) and whether the server supports reading chunks.
+        party, tile = self.game.client.batch([
+            'party:read',
+            ('world:read_chunk', {'position': [0, 0], 'size': [1, 1]})
+        ])
+        self.party = entities.party.Party.from_json_type(party)
+
+        if 'error' in tile:
+
+            # Fallback to reading the whole world
+            world = self.game.client.send('world:read')
+            self.overworld = entities.overworld.Overworld.from_json_type(
+                world
+            )
+
+        else:
+            world_size = tile['world_size']
+            self.overworld = entities.overworld.Overworld(
+                [world_size[1], world_size[0]],
+                settings.game.chunk_size
+            )
+
+            keys = self.overworld.get_chunk_keys(
+                self.party.y,
+                self.party.x,
+                settings.game.chunk_load_radius
+            )
+            for chunk in self.read_chunks(keys):
+                self.overworld.add_chunk(chunk)
+
+            self.chunked = True
+            self.party_chunk = self.overworld.get_chunk_key(
+                self.party.y,
+                self.party.x
+            )
 
         self.overworld.party = self.party
-
-        # Render the overworld to the viewport
-        self.overworld.render(self.viewport)
@@ -7,9 +7,11 @@ from game.states.state import GameState
 from game.ui.border import Border
 from game.ui.stats import StatBar, Stat
 from game.utils.colors import Colors
+from game.utils.frames import KeyframeIndex, compact_frames
 from game.utils.input import key_pressed
 from game.utils.player import get_player_uid
-from game.utils.rendering import Viewport
+from game.utils.rendering import Viewport, get_bounds
+from game.utils.replay import ReplayScheduler
 
 
 class Scene(GameState):
@@ -30,10 +32,28 @@ class Scene(GameState):
 
         self.active_player = kw['active_player']
         self.last_frame_no = self.game.frame_no
+        self.position = kw.get('position')
         self.player = None
-        self.replay_dt = 0
         self.scene = None
 
+        # Paces the replay of frames when we're behind the current frame
+        self.replay = ReplayScheduler(
+            settings.game.replay_frame_rate,
+            settings.game.max_frame_lag,
+            settings.game.replay_max_speed
+        )
+
+        # Periodic snapshots of the scene allowing us to seek to a frame, and
+        # a flag indicating we've rewound and are replaying frames.
+        self.keyframes = KeyframeIndex(
+            settings.game.keyframe_interval,
+            settings.game.max_keyframes
+        )
+        self.rewinding = False
+
+        # Hold on to frames for the state until it has replayed them
+        self.game.frames.consume(self.ID, self.last_frame_no)
+
         # A viewport to render the game world within
         self.viewport = Viewport()
 
@@ -65,10 +85,20 @@ class Scene(GameState):
             lambda: self.fetch_scene()
         )
 
+    def leave(self):
+        super().leave()
+
+        # Stop holding frames for the state
+        self.game.frames.release(self.ID)
+
     def input(self, char):
         super().input(char)
 
-        if not self.is_my_turn:
+        if key_pressed(f'controls.rewind', char):
+            self.rewind(settings.game.rewind_frames)
+
+        # We can't take our turn while we're showing the scene in the past
+        if not self.is_my_turn or self.rewinding:
             return
 
         if key_pressed(f'controls.end_turn', char):
@@ -97,20 +127,22 @@ class Scene(GameState):
 
         max_y, max_x = self.game.main_window.getmaxyx()
 
-        # Clear the viewport
-        self.viewport.clear()
+        viewport_rect = [2, 1, max_y - 9, max_x - 3]
+        offset = self.scene.get_offset(self.player.yx, [max_y - 8, max_x - 4])
 
-        # Render the dynamic elements within the overworld
-        self.scene.render(self.viewport)
+        # Render the tiles that have changed (or scrolled into view) within
+        # the scene
+        self.scene.render_changes(
+            self.viewport,
+            get_bounds(offset, viewport_rect[2:])
+        )
 
         # Draw the viewport's content
-        viewport_rect = [2, 1, max_y - 9, max_x - 3]
-
         self.viewport.render(
             ctx,
             viewport_rect[0:2],
             viewport_rect[2:],
-            self.scene.get_offset(self.player.yx, [max_y - 8, max_x - 4])
+            offset
         )
 
         # Update the height of the border to wrap the viewport
@@ -142,10 +174,70 @@ class Scene(GameState):
         """Move the player in the given direction"""
         self.game.client.send('move', {'direction': direction})
 
-    def move_to_frame_no(self, frame):
-        """Move to the given frame within the scene"""
+    def fast_forward(self, frame_no):
+        """
+        Move forward to the given frame within the scene. The frames passed
+        are compacted (e.g a run of moves by a player becomes a single move)
+        so that catching up costs one apply rather than one per frame, the
+        tiles changed are rendered on the next render.
+        """
+
+        frames = []
+        while self.last_frame_no < frame_no:
+            self.last_frame_no += 1
+            frame = self.get_frame(self.last_frame_no)
+            if frame:
+                frames.append(frame)
+
+        for frame in compact_frames(frames):
+            self.apply_frame(frame)
+
+    def get_entry_frames(self):
+        """
+        Return the frames from the party entering the scene up to the last
+        frame, or None if they're no longer held.
+        """
+
+        frame_no = self.last_frame_no
+        first_frame_no = max(0, frame_no - settings.game.max_frame_lag)
+
+        frames = []
+        while frame_no >= first_frame_no:
+            frame = self.game.frames.get_lazy(frame_no)
+            if frame is None:
+                return None
+
+            frames.append(frame)
+            if (
+                frame.get('actor') == 'party'
+                and frame.get('action') == 'enter_scene'
+            ):
+                return frames[::-1]
+
+            frame_no -= 1
 
-        frame = self.game.frames[self.last_frame_no]
+        return None
+
+    def get_frame(self, frame_no):
+        """Return the given frame (and let the frame store release it)"""
+
+        frame = self.game.frames.get_lazy(frame_no)
+
+        # Let the frame store know it no longer needs to keep the frame
+        self.game.frames.consume(self.ID, frame_no)
+
+        if frame is None:
+
+            # The frame was never received (or has been evicted)
+            logging.warning(f'Missing frame: {frame_no}')
+
+        return frame
+
+    def apply_frame(self, frame):
+        """
+        Apply a frame's changes to the scene (without rendering), returns
+        True if the frame changed the scene.
+        """
 
         actor = frame.get('actor')
         action = frame.get('action')
@@ -169,50 +261,167 @@ class Scene(GameState):
         # Update the scene with any scene changes
         if scene_changes:
             self.scene.apply_scene_changes(scene_changes)
-            self.scene.render(self.viewport)
+            return True
+
+        return False
+
+    def rewind(self, frames):
+        """
+        Show the scene as it was the given number of frames ago (or as near
+        to it as the frames held allow) and replay the frames since. Returns
+        False if we can't rewind.
+        """
+
+        frame_no = max(0, self.last_frame_no - frames)
+        frame_nos = [frame_no] + [
+            n for n in self.keyframes.frame_nos
+            if frame_no < n < self.last_frame_no
+        ]
+
+        for frame_no in frame_nos:
+            if self.seek(frame_no):
+                self.rewinding = True
+                self.replay.reset()
+                return True
+
+        return False
+
+    def seek(self, frame_no):
+        """
+        Show the scene as it was at the given frame, the scene is restored
+        from the nearest keyframe and the frames since applied. Returns False
+        if the frame can't be reconstructed (the frames required are no longer
+        held).
+        """
+
+        keyframe = self.keyframes.nearest(frame_no)
+        if keyframe is None:
+            return False
+
+        keyframe_no, keyframe = keyframe
+        snapshot, active_player, x, y, action_points = keyframe
+
+        frames = [
+            self.game.frames.get_lazy(n)
+            for n in range(keyframe_no + 1, frame_no + 1)
+        ]
+        if None in frames:
+            return False
+
+        self.scene.restore(snapshot)
+        self.active_player = active_player
+        self.player.x = x
+        self.player.y = y
+        self.player.action_points = list(action_points)
+
+        for frame in compact_frames(frames):
+            self.apply_frame(frame)
+
+        self.last_frame_no = frame_no
+        self.game.frames.consume(self.ID, frame_no)
+
+        return True
+
+    def take_keyframe(self):
+        """Take a keyframe of the scene (and player) at the last frame"""
+        self.keyframes.add(
+            self.last_frame_no,
+            (
+                self.scene.snapshot(),
+                self.active_player,
+                self.player.x,
+                self.player.y,
+                list(self.player.action_points)
+            )
+        )
 
     def sync_frame(self, dt):
         """Sync view to the current frame"""
 
         max_frame_lag = settings.game.max_frame_lag
-        if self.last_frame_no < (self.game.frame_no - max_frame_lag):
+        if (
+            not self.rewinding
+            and self.last_frame_no < (self.game.frame_no - max_frame_lag)
+        ):
 
             # Don't allow the player to lag too far behind the current game
             # frame.
-
-            while self.last_frame_no < (self.game.frame_no - max_frame_lag):
-
-                # Increment the frame by one
-                self.last_frame_no += 1
-
-                # Apply the frame
-                self.move_to_frame_no(self.last_frame_no)
+            self.fast_forward(self.game.frame_no - max_frame_lag)
 
         if self.last_frame_no < self.game.frame_no:
 
             # The player is currently behind the most recent game frame so
-            # replay past frames to catch up.
-            self.replay_dt += dt
+            # replay past frames to catch up (faster the further behind).
+            frames = self.replay.advance(
+                dt,
+                self.game.frame_no - self.last_frame_no
+            )
 
-            if self.replay_dt > 1 / settings.game.replay_frame_rate:
+            if frames:
+                self.fast_forward(self.last_frame_no + frames)
 
-                # Increment the frame by one
-                self.last_frame_no += 1
+        if self.last_frame_no >= self.game.frame_no:
+            self.rewinding = False
 
-                # Apply the frame
-                self.move_to_frame_no(self.last_frame_no)
+        if self.keyframes.due(self.last_frame_no):
+            self.take_keyframe()
 
     # Bootstraps
 
     def fetch_scene(self):
-        """Fetch the scene from the server"""
-        self.scene = entities.scene.Scene.from_json_type(
-            self.game.client.send('scene:read')
-        )
+        """
+        Fetch the scene (and player) from the server, or use those prefetched
+        by the overworld if we have them (and the frames since the party
+        entered the scene).
+        """
+
+        prefetcher = self.game.prefetcher
+
+        scene = player = None
+        if self.position:
+            scene = prefetcher.take(('scene', *self.position))
+            if scene:
+                player = prefetcher.take(('player',))
+
+        # Anything else the overworld prefetched is no longer needed
+        prefetcher.clear()
+
+        # The prefetched scene (and player) were read before the party
+        # entered the scene, they can only be brought up to date if the frame
+        # of the party entering the scene says where its players were placed.
+        frames = self.get_entry_frames() if scene else None
+        placed = None
+        if frames and frames[0].get('scene_changes'):
+            entry_data = frames[0].get('data') or {}
+            placed = (entry_data.get('players') or {}).get(
+                str(get_player_uid())
+            )
 
-        self.player = entities.player.Player.from_json_type(
-            self.game.client.send('player:read')
-        )
+        if placed is None:
+            scene, player = self.game.client.batch(
+                ['scene:read', 'player:read']
+            )
+            self.scene = entities.scene.Scene.from_json_type(scene)
+            self.player = entities.player.Player.from_json_type(player)
+
+        else:
+            entry_frame, *frames = frames
+
+            # Where the player starts is taken from the frame of the party
+            # entering the scene.
+            if player:
+                player = dict(player, **placed)
+            else:
+                player = self.game.client.send('player:read')
+
+            self.scene = entities.scene.Scene.from_json_type(scene)
+            self.player = entities.player.Player.from_json_type(player)
+
+            # Bring the prefetched scene up to date, the first frame is the
+            # party entering the scene.
+            self.scene.apply_scene_changes(entry_frame.get('scene_changes'))
+            for frame in compact_frames(frames):
+                self.apply_frame(frame)
 
         self.stats['name'].value = (
             f'{self.player.name} '
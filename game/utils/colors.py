@@ -12,6 +12,10 @@ class Colors:
     # A look up table of color pairs
     _color_pairs = {}
 
+    # Flag indicating the game is running without a terminal in which case
+    # the palette isn't sent to curses.
+    _headless = False
+
     @classmethod
     def add_color(cls, name, r, g, b):
         """Add a color to the games palette"""
@@ -20,12 +24,13 @@ class Colors:
 
         setattr(cls, name, cls._color_index)
 
-        curses.init_color(
-            cls._color_index,
-            round(r / 255 * 1000),
-            round(g / 255 * 1000),
-            round(b / 255 * 1000)
-        )
+        if not cls._headless:
+            curses.init_color(
+                cls._color_index,
+                round(r / 255 * 1000),
+                round(g / 255 * 1000),
+                round(b / 255 * 1000)
+            )
 
         cls._color_index += 1
 
@@ -49,11 +54,13 @@ class Colors:
         )
 
     @classmethod
-    def init(cls):
+    def init(cls, headless=False):
         """
         Initialize the palette of colours that can be used within the game.
         """
 
+        cls._headless = headless
+
         for name, hex_color in settings.colors.items():
             cls.add_color(name, *cls.hex_to_rgb(hex_color))
 
@@ -70,11 +77,19 @@ class Colors:
                     'Too many color pairs defined.'
 
             cls._color_pairs[(fg, bg)] = cls._color_pair_index
-            curses.init_pair(
-                cls._color_pair_index,
-                getattr(cls, fg),
-                getattr(cls, bg)
-            )
+
+            if not cls._headless:
+                curses.init_pair(
+                    cls._color_pair_index,
+                    getattr(cls, fg),
+                    getattr(cls, bg)
+                )
+
             cls._color_pair_index += 1
 
+        if cls._headless:
+
+            # Encode the pair as curses would (without requiring curses)
+            return cls._color_pairs[pair] << 8
+
         return curses.color_pair(cls._color_pairs[pair])
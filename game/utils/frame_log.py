@@ -0,0 +1,256 @@
+"""
+The frame log module provides an append-only on-disk log of the frames
+received from the game server, allowing a session to be replayed (e.g by a
+spectator or post-mortem tooling) without holding its frames in memory or
+fetching them from the server again.
+
+A log is made up of two files:
+
+- `<name>.log` a sequence of records, each a header (the length of the
+  frame's data and the codec it's encoded with) followed by the encoded frame.
+- `<name>.idx` the number of the first frame logged followed by the offset of
+  each frame's record within the log (-1 for frames never received), so any
+  frame can be found in O(1).
+
+Both files are read through `mmap`.
+"""
+
+import mmap
+import os
+import struct
+
+from game.clients.codecs import JSONCodec, get_codec
+from game.utils.frames import LazyFrame
+
+__all__ = ['FrameLog']
+
+
+# The codecs frames can be logged with (a record's codec is its index)
+CODECS = ['json', 'msgpack']
+
+# The index header (the first frame number) and entries (record offsets)
+INDEX_HEADER = struct.Struct('>q')
+INDEX_ENTRY = struct.Struct('>q')
+
+# The header for each record (data length, codec)
+RECORD_HEADER = struct.Struct('>IB')
+
+
+class FrameLog:
+    """
+    An append-only log of frames with random access by frame number. Logs
+    opened read only (`writable=False`) can be read while another process
+    appends to them.
+    """
+
+    def __init__(self, path, writable=True):
+        self._path = path
+        self._writable = writable
+
+        # The first frame number in the log and the number of index entries
+        self._first_frame_no = None
+        self._count = 0
+
+        mode = 'a+b' if writable else 'rb'
+        self._log_file = open(f'{path}.log', mode)
+        self._index_file = open(f'{path}.idx', mode)
+
+        # The memory maps of the log and index files, mapped when first read
+        # and re-mapped when the files have grown beyond them.
+        self._log_map = None
+        self._index_map = None
+
+        self._load_index()
+
+        # Frames appended out of order update the index in place, to do this
+        # we need a separate handle on the index (appending ignores seeks).
+        self._index_writer = None
+        if writable:
+            self._index_writer = open(f'{path}.idx', 'r+b')
+
+    def __contains__(self, frame_no):
+        return self._offset(frame_no) >= 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def first_frame_no(self):
+        return self._first_frame_no
+
+    @property
+    def last_frame_no(self):
+        if self._first_frame_no is None:
+            return None
+        return self._first_frame_no + self._count - 1
+
+    @property
+    def path(self):
+        return self._path
+
+    def append(self, frame_no, frame):
+        """Append a frame (or `LazyFrame`) to the log"""
+
+        assert self._writable, 'Frame log opened read only.'
+
+        if self._first_frame_no is None:
+            self._first_frame_no = frame_no
+            self._index_file.write(INDEX_HEADER.pack(frame_no))
+
+        elif frame_no < self._first_frame_no:
+
+            # Frames before the start of the log can't be indexed
+            return
+
+        # Write the record
+        codec_name, data = self._encode(frame)
+        self._log_file.seek(0, os.SEEK_END)
+        offset = self._log_file.tell()
+        self._log_file.write(
+            RECORD_HEADER.pack(len(data), CODECS.index(codec_name))
+        )
+        self._log_file.write(data)
+        self._log_file.flush()
+
+        # Index the record
+        i = frame_no - self._first_frame_no
+        if i < self._count:
+
+            # The frame has been logged before, point to the latest record
+            self._index_file.flush()
+            self._index_writer.seek(INDEX_HEADER.size + i * INDEX_ENTRY.size)
+            self._index_writer.write(INDEX_ENTRY.pack(offset))
+            self._index_writer.flush()
+
+        else:
+
+            # Mark any frames we skipped as missing
+            self._index_file.write(
+                INDEX_ENTRY.pack(-1) * (i - self._count)
+                + INDEX_ENTRY.pack(offset)
+            )
+            self._index_file.flush()
+            self._count = i + 1
+
+    def close(self):
+        """Close the log"""
+
+        for map_ in (self._log_map, self._index_map):
+            if map_ is not None:
+                map_.close()
+
+        self._log_map = None
+        self._index_map = None
+
+        self._log_file.close()
+        self._index_file.close()
+
+        if self._index_writer:
+            self._index_writer.close()
+
+    def get(self, frame_no, default=None):
+        """Return the decoded frame with the given frame number"""
+
+        frame = self.get_lazy(frame_no)
+        if frame is None:
+            return default
+
+        return frame.decode()
+
+    def get_lazy(self, frame_no):
+        """Return the frame with the given frame number still encoded"""
+
+        offset = self._offset(frame_no)
+        if offset < 0:
+            return None
+
+        start = offset + RECORD_HEADER.size
+        log_map = self._map_log(start)
+        if log_map is None:
+            return None
+
+        length, codec = RECORD_HEADER.unpack_from(log_map, offset)
+
+        log_map = self._map_log(start + length)
+        if log_map is None:
+            return None
+
+        return LazyFrame(
+            log_map[start:start + length],
+            get_codec(CODECS[codec])
+        )
+
+    # Helpers
+
+    def _encode(self, frame):
+        """Return the codec name and encoded data to log for a frame"""
+
+        if isinstance(frame, LazyFrame):
+            data = frame.data
+            if isinstance(data, str):
+                data = data.encode('utf8')
+            return frame.codec.name, data
+
+        return JSONCodec.name, JSONCodec().encode(frame)
+
+    def _load_index(self):
+        """Read the first frame number and number of entries from the index"""
+
+        size = os.fstat(self._index_file.fileno()).st_size
+        if size < INDEX_HEADER.size:
+            return
+
+        self._index_file.seek(0)
+        self._first_frame_no = INDEX_HEADER.unpack(
+            self._index_file.read(INDEX_HEADER.size)
+        )[0]
+        self._count = (size - INDEX_HEADER.size) // INDEX_ENTRY.size
+
+    def _map(self, f, current, size):
+        """Return a memory map of the file covering at least `size` bytes"""
+
+        if current is not None and len(current) >= size:
+            return current
+
+        if current is not None:
+            current.close()
+
+        if os.fstat(f.fileno()).st_size < size:
+            return None
+
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _map_index(self, size):
+        self._index_map = self._map(self._index_file, self._index_map, size)
+        return self._index_map
+
+    def _map_log(self, size):
+        self._log_map = self._map(self._log_file, self._log_map, size)
+        return self._log_map
+
+    def _offset(self, frame_no):
+        """Return the offset of a frame's record (or -1 if not logged)"""
+
+        if self._first_frame_no is None:
+            self._load_index()
+            if self._first_frame_no is None:
+                return -1
+
+        i = frame_no - self._first_frame_no
+        if i < 0:
+            return -1
+
+        if i >= self._count and not self._writable:
+
+            # Another process may have logged the frame since we looked
+            self._load_index()
+
+        if i >= self._count:
+            return -1
+
+        position = INDEX_HEADER.size + i * INDEX_ENTRY.size
+        index_map = self._map_index(position + INDEX_ENTRY.size)
+        if index_map is None:
+            return -1
+
+        return INDEX_ENTRY.unpack_from(index_map, position)[0]
@@ -0,0 +1,454 @@
+"""
+The frames module provides a bounded store for the frames received from the
+game server.
+"""
+
+import bisect
+import logging
+import sys
+
+__all__ = [
+    'FrameStore',
+    'KeyframeIndex',
+    'LazyFrame',
+    'compact_frames'
+]
+
+
+class FrameStore:
+    """
+    A ring buffer of frames indexed by (contiguous) frame number.
+
+    Game states register as consumers of the store as they replay frames, a
+    frame is only evicted once the store is over capacity and every consumer
+    has consumed it, so a consumer never misses a frame. Once consumers catch
+    up the store shrinks back to its capacity. Likewise a gap in the frames
+    received too large to bridge only restarts the store if every frame held
+    has been consumed.
+
+    If a frame log (see `game.utils.frame_log`) is given every frame added is
+    also appended to the log, and frames no longer held in memory are read
+    back from it.
+    """
+
+    def __init__(self, capacity, log=None):
+        assert capacity > 0, 'Capacity must be greater than 0.'
+
+        self._capacity = capacity
+        self._log = log
+
+        # The buffer of frames, frame `n` is stored in slot `n % len(slots)`
+        self._slots = [None] * capacity
+
+        # The range of frame numbers currently stored (inclusive)
+        self._first_frame_no = 0
+        self._last_frame_no = -1
+
+        # A table of the last frame number consumed by each consumer
+        self._consumers = {}
+
+    def __contains__(self, frame_no):
+        if self._first_frame_no <= frame_no <= self._last_frame_no:
+            if self._slots[frame_no % len(self._slots)] is not None:
+                return True
+
+        if self._log is not None:
+            return frame_no in self._log
+
+        return False
+
+    def __getitem__(self, frame_no):
+        frame = self.get(frame_no)
+        if frame is None:
+            raise KeyError(frame_no)
+        return frame
+
+    def __len__(self):
+        return self._last_frame_no - self._first_frame_no + 1
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def first_frame_no(self):
+        return self._first_frame_no
+
+    @property
+    def last_frame_no(self):
+        return self._last_frame_no
+
+    @property
+    def log(self):
+        return self._log
+
+    def add(self, frame_no, frame):
+        """Add a frame to the store"""
+
+        if self._log is not None:
+            self._log.append(frame_no, frame)
+
+        if len(self) == 0:
+            self._first_frame_no = frame_no
+            self._last_frame_no = frame_no - 1
+
+        if frame_no <= self._last_frame_no:
+
+            # Replace a frame we already hold, frames older than those held
+            # have been evicted and are ignored.
+            if frame_no >= self._first_frame_no:
+                self._slots[frame_no % len(self._slots)] = frame
+            return
+
+        if frame_no - self._last_frame_no > len(self._slots):
+
+            if any(
+                c < self._last_frame_no for c in self._consumers.values()
+            ):
+
+                # The frame is too far ahead to bridge the gap, but frames we
+                # hold have yet to be consumed so grow to hold the gap too.
+                logging.warning(
+                    f'Frame gap {self._last_frame_no}-{frame_no} with '
+                    'frames unconsumed, growing the frame store'
+                )
+                size = len(self._slots)
+                while size < frame_no - self._first_frame_no + 1:
+                    size *= 2
+                self._resize(size)
+
+            else:
+
+                # The frame is too far ahead to bridge the gap and every
+                # frame we hold has been consumed, start again.
+                logging.info(
+                    f'Frame gap {self._last_frame_no}-{frame_no}, '
+                    'restarting the frame store'
+                )
+                self._first_frame_no = frame_no
+                self._last_frame_no = frame_no - 1
+                self._slots = [None] * len(self._slots)
+
+        # Frames missing between the last frame and this one are left empty
+        while self._last_frame_no < frame_no:
+
+            if len(self) == len(self._slots) and not self._evict():
+                self._grow()
+
+            self._last_frame_no += 1
+            self._slots[self._last_frame_no % len(self._slots)] = None
+
+        self._slots[frame_no % len(self._slots)] = frame
+
+    def clear(self):
+        """Remove all frames from the store"""
+        self._slots = [None] * self._capacity
+        self._first_frame_no = 0
+        self._last_frame_no = -1
+
+    def consume(self, consumer, frame_no):
+        """
+        Record that the consumer (e.g a game state) has consumed all frames up
+        to and including the given frame number.
+        """
+
+        self._consumers[consumer] = frame_no
+        self._trim()
+
+    def get(self, frame_no, default=None):
+        """
+        Return the frame with the given frame number, frames stored encoded
+        are decoded (once) on access.
+        """
+
+        if self._first_frame_no <= frame_no <= self._last_frame_no:
+            slot = frame_no % len(self._slots)
+            frame = self._slots[slot]
+
+            if isinstance(frame, LazyFrame):
+                frame = self._slots[slot] = frame.decode()
+
+            if frame is not None:
+                return frame
+
+        if self._log is not None:
+            return self._log.get(frame_no, default)
+
+        return default
+
+    def get_lazy(self, frame_no, default=None):
+        """
+        Return the frame with the given frame number as stored (frames
+        stored encoded are returned as a `LazyFrame` and left encoded).
+        """
+
+        if self._first_frame_no <= frame_no <= self._last_frame_no:
+            frame = self._slots[frame_no % len(self._slots)]
+            if frame is not None:
+                return frame
+
+        if self._log is not None:
+            frame = self._log.get_lazy(frame_no)
+            if frame is not None:
+                return frame
+
+        return default
+
+    def memory_usage(self):
+        """Return an estimate of the memory (in bytes) used by the store"""
+
+        size = sys.getsizeof(self._slots)
+        for frame in self._slots:
+            if frame is not None:
+                size += _sizeof(frame)
+
+        return size
+
+    def release(self, consumer):
+        """Stop holding frames for the given consumer"""
+        self._consumers.pop(consumer, None)
+        self._trim()
+
+    # Helpers
+
+    def _evict(self):
+        """Evict the oldest frame if every consumer has consumed it"""
+
+        frame_no = self._first_frame_no
+        if any(c < frame_no for c in self._consumers.values()):
+            return False
+
+        self._slots[frame_no % len(self._slots)] = None
+        self._first_frame_no += 1
+
+        return True
+
+    def _grow(self):
+        self._resize(len(self._slots) * 2)
+
+    def _resize(self, size):
+        slots = [None] * size
+        for frame_no in range(self._first_frame_no, self._last_frame_no + 1):
+            slots[frame_no % size] = self._slots[frame_no % len(self._slots)]
+
+        self._slots = slots
+
+    def _trim(self):
+        """Evict frames held over capacity that have now been consumed"""
+
+        while len(self) > self._capacity and self._evict():
+            pass
+
+        if len(self._slots) > self._capacity and len(self) <= self._capacity:
+            self._resize(self._capacity)
+
+
+class LazyFrame:
+    """
+    A frame received from the server still encoded, frames are only decoded
+    when first accessed so frames that are never looked at (e.g those
+    skipped by the party leader or evicted) are never decoded.
+
+    Frames may also be received with only their (bulky) scene changes
+    encoded, in which case the frame's actor, action and data can be read
+    without decoding the scene changes, which are only decoded if accessed.
+    """
+
+    __slots__ = ('_codec', '_data', '_frame')
+
+    def __init__(self, data, codec):
+        self._data = data
+        self._codec = codec
+
+        # The frame as decoded so far
+        self._frame = data if isinstance(data, dict) else None
+
+    def __getitem__(self, key):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def __sizeof__(self):
+        size = object.__sizeof__(self) + _sizeof(self._data)
+        if self._frame is not None and self._frame is not self._data:
+            size += _sizeof(self._frame)
+        return size
+
+    @property
+    def codec(self):
+        return self._codec
+
+    @property
+    def data(self):
+        """The frame as encoded"""
+
+        if isinstance(self._data, dict):
+            return self._codec.encode(self._data)
+
+        return self._data
+
+    def decode(self):
+        """Return the decoded frame"""
+        return {key: self.get(key) for key in self.keys()}
+
+    def get(self, key, default=None):
+        """
+        Return the value of a field in the frame, the frame's scene changes
+        are only decoded if asked for.
+        """
+
+        if self._frame is None:
+            self._frame = self._codec.decode(self._data)
+
+        value = self._frame.get(key, default)
+
+        # Scene changes received encoded are decoded (each time) they're
+        # accessed rather than kept decoded alongside the encoded frame.
+        if key == 'scene_changes' and isinstance(value, (bytes, str)):
+            value = self._codec.decode(value)
+
+        return value
+
+    def keys(self):
+        if self._frame is None:
+            self._frame = self._codec.decode(self._data)
+
+        return self._frame.keys()
+
+
+class KeyframeIndex:
+    """
+    An index of keyframes (snapshots of a game state's world) taken every
+    `interval` frames, so the world at any frame after the oldest keyframe
+    can be reconstructed by restoring the nearest keyframe and applying at
+    most `interval` frames.
+
+    Only the latest `limit` keyframes are kept.
+    """
+
+    def __init__(self, interval, limit):
+        assert interval > 0, 'Interval must be greater than 0.'
+
+        self._interval = interval
+        self._limit = limit
+
+        # The frame numbers we hold keyframes for (in order), and a table of
+        # keyframes (by frame number).
+        self._frame_nos = []
+        self._keyframes = {}
+
+    def __len__(self):
+        return len(self._frame_nos)
+
+    @property
+    def frame_nos(self):
+        return list(self._frame_nos)
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def last_frame_no(self):
+        if self._frame_nos:
+            return self._frame_nos[-1]
+        return None
+
+    def add(self, frame_no, keyframe):
+        """Add a keyframe (the state of the world after the frame)"""
+
+        if frame_no not in self._keyframes:
+            bisect.insort(self._frame_nos, frame_no)
+
+        self._keyframes[frame_no] = keyframe
+
+        while len(self._frame_nos) > self._limit:
+            del self._keyframes[self._frame_nos.pop(0)]
+
+    def clear(self):
+        """Remove all keyframes"""
+        self._frame_nos = []
+        self._keyframes = {}
+
+    def due(self, frame_no):
+        """Return True if a keyframe should be taken at the given frame"""
+
+        last_frame_no = self.last_frame_no
+        return last_frame_no is None \
+                or frame_no - last_frame_no >= self._interval
+
+    def nearest(self, frame_no):
+        """
+        Return the nearest keyframe at or before the given frame as
+        (frame_no, keyframe), or None if there isn't one.
+        """
+
+        i = bisect.bisect_right(self._frame_nos, frame_no)
+        if i == 0:
+            return None
+
+        keyframe_no = self._frame_nos[i - 1]
+        return keyframe_no, self._keyframes[keyframe_no]
+
+
+def compact_frames(frames):
+    """
+    Fold a sequence of frames into the fewest frames with the same net effect.
+    Consecutive frames in which the same actor performs the same action (e.g
+    a run of party moves) are merged into one frame, the last change to each
+    tile wins and the data is taken from the final frame of the run.
+
+    Frames may be given as `LazyFrame`s, runs are found from each frame's
+    actor, action and data and each frame's scene changes are decoded once,
+    straight into the compacted frame.
+    """
+
+    compacted = []
+    for frame in frames:
+
+        if compacted and _can_merge(compacted[-1], frame):
+            merged = compacted[-1]
+            merged['data'] = frame.get('data')
+            merged['scene_changes'].update(frame.get('scene_changes') or {})
+            continue
+
+        # Copy the frame so the stored frame isn't modified by merging
+        merged = {
+            key: frame.get(key)
+            for key in frame.keys()
+            if key != 'scene_changes'
+        }
+        merged['scene_changes'] = dict(frame.get('scene_changes') or {})
+        compacted.append(merged)
+
+    return compacted
+
+
+def _can_merge(frame, next_frame):
+    """Return True if the next frame can be merged into the frame"""
+
+    data = frame.get('data') or {}
+    next_data = next_frame.get('data') or {}
+
+    return (
+        frame.get('actor') == next_frame.get('actor')
+        and frame.get('action') == next_frame.get('action')
+        and data.get('active_player') == next_data.get('active_player')
+    )
+
+
+def _sizeof(obj):
+    """Return the approximate size of an object and its contents in bytes"""
+
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _sizeof(key) + _sizeof(value)
+
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            size += _sizeof(value)
+
+    return size
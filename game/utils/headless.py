@@ -0,0 +1,174 @@
+"""
+An offscreen stand-in for curses windows, allowing the game to run (and be
+profiled) without a terminal.
+"""
+
+import curses
+
+__all__ = [
+    'HeadlessWindow',
+    'init_acs_chars'
+]
+
+
+# Line drawing characters normally defined by `curses.initscr()`
+ACS_CHARS = {
+    'ACS_HLINE': '─',
+    'ACS_VLINE': '│',
+    'ACS_ULCORNER': '┌',
+    'ACS_URCORNER': '┐',
+    'ACS_LLCORNER': '└',
+    'ACS_LRCORNER': '┘'
+}
+
+
+def init_acs_chars():
+    """
+    Define the curses line drawing characters if curses hasn't been
+    initialized (they're only defined by `curses.initscr()`).
+    """
+    for name, char in ACS_CHARS.items():
+        if not hasattr(curses, name):
+            setattr(curses, name, ord(char))
+
+
+class HeadlessWindow:
+    """
+    An in-memory character/attribute grid implementing the subset of the
+    curses window API used by the game. Sub windows share their parent's grid.
+
+    Unlike curses, writes outside of the window are clipped rather than
+    raising an error.
+    """
+
+    def __init__(self, height, width, top=0, left=0, grid=None):
+        self._height = height
+        self._width = width
+        self._top = top
+        self._left = left
+        self._background = (' ', 0)
+
+        # The grid of (char, attr) cells, shared with any sub windows
+        self._grid = grid or [
+            [(' ', 0)] * width for y in range(height)
+        ]
+
+        # Keys queued for `getch`
+        self._input = []
+
+    @property
+    def grid(self):
+        return self._grid
+
+    # Content
+
+    def addch(self, y, x, ch, attr=0):
+        self._put(y, x, ch, attr)
+
+    def addstr(self, y, x, string, attr=0):
+        for ch in string:
+
+            # As with curses a new line moves to the start of the next line
+            if ch == '\n':
+                y += 1
+                x = 0
+                continue
+
+            self._put(y, x, ch, attr)
+            x += 1
+
+    def insstr(self, y, x, string, attr=0):
+        self.addstr(y, x, string[:max(0, self._width - x)], attr)
+
+    def hline(self, y, x, ch, n, attr=0):
+        for i in range(n):
+            self._put(y, x + i, ch, attr)
+
+    def vline(self, y, x, ch, n, attr=0):
+        for i in range(n):
+            self._put(y + i, x, ch, attr)
+
+    def bkgd(self, ch, attr=0):
+        self._background = (ch, attr)
+
+    def erase(self):
+        for y in range(self._height):
+            for x in range(self._width):
+                self._put(y, x, *self._background)
+
+    def clear(self):
+        self.erase()
+
+    def text(self):
+        """Return the window's content as text"""
+        return '\n'.join(
+            ''.join(cell[0] for cell in row[self._left:self._left + self._width])
+            for row in self._grid[self._top:self._top + self._height]
+        )
+
+    # Windows
+
+    def derwin(self, *args):
+        """Return a sub window positioned relative to this window"""
+        nlines, ncols, begin_y, begin_x = self._sub_args(args)
+        return self._sub(nlines, ncols, self._top + begin_y, self._left + begin_x)
+
+    def subwin(self, *args):
+        """Return a sub window positioned relative to the screen"""
+        nlines, ncols, begin_y, begin_x = self._sub_args(args)
+        return self._sub(nlines, ncols, begin_y, begin_x)
+
+    def getbegyx(self):
+        return (self._top, self._left)
+
+    def getmaxyx(self):
+        return (self._height, self._width)
+
+    # Input
+
+    def getch(self):
+        if self._input:
+            return self._input.pop(0)
+        return curses.ERR
+
+    def push_input(self, char):
+        """Queue a key to be returned by `getch`"""
+        self._input.append(char if isinstance(char, int) else ord(char))
+
+    def keypad(self, flag):
+        pass
+
+    def nodelay(self, flag):
+        pass
+
+    def noutrefresh(self):
+        pass
+
+    def refresh(self):
+        pass
+
+    # Helpers
+
+    def _put(self, y, x, ch, attr):
+        if 0 <= y < self._height and 0 <= x < self._width:
+            if isinstance(ch, int):
+                ch = chr(ch)
+            self._grid[self._top + y][self._left + x] = (ch, attr)
+
+    def _sub(self, nlines, ncols, top, left):
+        bottom = self._top + self._height
+        right = self._left + self._width
+
+        # Clip the sub window to this window
+        return HeadlessWindow(
+            max(0, min(nlines or bottom - top, bottom - top)),
+            max(0, min(ncols or right - left, right - left)),
+            top,
+            left,
+            self._grid
+        )
+
+    def _sub_args(self, args):
+        if len(args) == 2:
+            return (0, 0) + tuple(args)
+        return tuple(args)
@@ -2,6 +2,9 @@ import logging
 
 __all__ = [
     'Viewport',
+    'cells',
+    'clamp_bounds',
+    'get_bounds',
     'in_bounds'
 ]
 
@@ -28,6 +31,14 @@ class Viewport:
                 self.buffers[z][y] = {}
                 self.buffers[z][y][x] = (char, styles)
 
+    def erase(self, y, x, z):
+        """Erase a character from the viewport"""
+
+        try:
+            del self.buffers[z][y][x]
+        except KeyError:
+            pass
+
     def clear(self, z=None):
         """Clear a buffer (or all buffers if z is None) within the viewport"""
 
@@ -41,47 +52,81 @@ class Viewport:
         """Render the contents of the viewport"""
 
         # Determine the bounds of the content we can render in
-        bounds = [
-            offset[0],
-            offset[1],
-            offset[0] + size[0],
-            offset[1] + size[1]
-        ]
-
-        # Render the viewport
+        bounds = get_bounds(offset, size)
+        rows_in_view = range(bounds[0], bounds[2] + 1)
+        columns_in_view = range(bounds[1], bounds[3] + 1)
+
+        # Render the viewport (visiting only the cells within the bounds)
         layers = sorted(self.buffers.keys())
         for z in layers:
 
             rows = self.buffers[z]
-            for y in sorted(rows.keys()):
-                if y < bounds[0]:
+            for y in rows_in_view:
+                columns = rows.get(y)
+                if not columns:
                     continue
 
-                elif y > bounds[2]:
-                    break
-
-                columns = rows[y]
-                for x in sorted(rows[y].keys()):
-                    if x < bounds[1]:
-                        continue
-
-                    elif x > bounds[3]:
-                        break
+                ry = position[0] + (y - offset[0])
 
+                for x in columns_in_view:
                     cell = columns.get(x)
                     if cell:
-
-                        ry = position[0] + (y - offset[0])
-                        rx = position[1] + (x - offset[1])
-
                         ctx.addch(
                             ry,
-                            rx,
+                            position[1] + (x - offset[1]),
                             cell[0],
                             cell[1]
                         )
 
 
+def cells(bounds, exclude=None):
+    """
+    Yield the y, x coordinates of the cells within the given bounds,
+    skipping any also within the `exclude` bounds.
+    """
+
+    for y in range(bounds[0], bounds[2] + 1):
+
+        if exclude is None or y < exclude[0] or y > exclude[2]:
+            for x in range(bounds[1], bounds[3] + 1):
+                yield y, x
+
+        else:
+            for x in range(bounds[1], min(bounds[3] + 1, exclude[1])):
+                yield y, x
+
+            for x in range(max(bounds[1], exclude[3] + 1), bounds[3] + 1):
+                yield y, x
+
+
+def clamp_bounds(bounds, margin, size):
+    """
+    Return the given bounds grown by a margin and clamped to an area of the
+    given size.
+    """
+
+    return [
+        max(0, bounds[0] - margin),
+        max(0, bounds[1] - margin),
+        min(size[0] - 1, bounds[2] + margin),
+        min(size[1] - 1, bounds[3] + margin)
+    ]
+
+
+def get_bounds(offset, size):
+    """
+    Return the bounds (top, left, bottom, right) of the content a viewport
+    of the given size renders at the given offset.
+    """
+
+    return [
+        offset[0],
+        offset[1],
+        offset[0] + size[0],
+        offset[1] + size[1]
+    ]
+
+
 def in_bounds(bounds, y, x):
     """Return true if y and z are within the given bounds"""
 
@@ -0,0 +1,95 @@
+"""
+The replay module paces the replay of frames for game states that passively
+observe the game (e.g players who aren't leading the party).
+"""
+
+__all__ = [
+    'ReplayScheduler',
+    'simulate_catch_up'
+]
+
+
+class ReplayScheduler:
+    """
+    Paces the replay of frames by wall clock. Frames are replayed at the
+    replay frame rate when the player is close to the current frame, and
+    faster the further behind they fall, up to `max_speed` times the frame
+    rate as the lag approaches `max_frame_lag`.
+    """
+
+    def __init__(self, frame_rate, max_frame_lag, max_speed=1):
+        assert frame_rate > 0, 'Frame rate must be greater than 0.'
+
+        self.frame_rate = frame_rate
+        self.max_frame_lag = max_frame_lag
+        self.max_speed = max(1, max_speed)
+
+        # The (fractional) number of frames due to be replayed
+        self._due = 0
+
+    def advance(self, dt, lag):
+        """
+        Return the number of frames to replay given the time (in seconds)
+        since the last call and the number of frames the player is behind.
+        """
+
+        if lag <= 0:
+
+            # Don't bank time while there's nothing to replay
+            self._due = 0
+            return 0
+
+        self._due += dt * self.frame_rate * self.speed(lag)
+
+        frames = min(int(self._due), lag)
+        self._due -= frames
+
+        # Don't carry more than a frame over (e.g after a long stall)
+        self._due = min(self._due, 1)
+
+        return frames
+
+    def reset(self):
+        self._due = 0
+
+    def speed(self, lag):
+        """Return the replay speed (a multiple of the frame rate) for a lag"""
+
+        if lag <= 1 or self.max_frame_lag <= 1:
+            return 1
+
+        t = min(1, (lag - 1) / (self.max_frame_lag - 1))
+        return 1 + (self.max_speed - 1) * t
+
+
+def simulate_catch_up(
+    scheduler,
+    backlog,
+    server_frame_rate=0,
+    dt=0.01,
+    limit=60
+):
+    """
+    Simulate a player catching up on a backlog of frames with the given
+    scheduler, called every `dt` seconds (of simulated time) while the server
+    continues to produce frames at the given rate.
+
+    Returns the time taken to catch up (or None if the player doesn't catch
+    up within the limit) and the max lag seen.
+    """
+
+    frame_no = 0
+    max_lag = backlog
+    t = 0
+
+    while t < limit:
+        t += dt
+
+        server_frame_no = backlog + int(t * server_frame_rate)
+        frame_no += scheduler.advance(dt, server_frame_no - frame_no)
+        max_lag = max(max_lag, server_frame_no - frame_no)
+
+        if frame_no >= server_frame_no:
+            return t, max_lag
+
+    return None, max_lag
@@ -1,4 +1,5 @@
 
+import curses
 import logging
 
 from game.settings import settings
@@ -25,6 +26,141 @@ class Sprite:
         return Colors.pair(self.color, settings.ui.bg_color)
 
 
+class SpritePaths:
+    """
+    A table interning sprite paths (e.g `(5, 2, 1)`) as small integer ids so
+    that tiles can be stored compactly in arrays. The id 0 is reserved for
+    no sprite (sent by the server as -1).
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._paths = [None]
+
+    def __len__(self):
+        return len(self._paths) - 1
+
+    def id(self, path):
+        """Return the id for a sprite path (as sent by the server)"""
+
+        if path == -1 or path is None:
+            return 0
+
+        path = tuple(path)
+
+        try:
+            return self._ids[path]
+        except KeyError:
+            self._ids[path] = len(self._paths)
+            self._paths.append(path)
+            return self._ids[path]
+
+    def path(self, sprite_id):
+        """Return the sprite path for an id (or None for no sprite)"""
+        return self._paths[sprite_id]
+
+    def stack(self, sprite_ids):
+        """Return the sprite paths for a stack of ids"""
+        return tuple(self._paths[i] for i in sprite_ids)
+
+    def stack_ids(self, paths):
+        """
+        Return the ids for a stack of sprites as sent by the server, either
+        -1 (none), a single sprite path or a list of sprite paths (bottom to
+        top).
+        """
+
+        if paths == -1 or paths is None:
+            return ()
+
+        if paths and not isinstance(paths[0], (list, tuple)):
+            return (self.id(paths),)
+
+        return tuple(self.id(path) for path in paths)
+
+
+class SpriteGlyphs:
+    """
+    A table of the glyphs (character, attributes) sprites render as, by
+    glyph id, so that tiles can store the glyph for their top most layer
+    compactly and rendering doesn't need to resolve sprites. The id 0 is
+    reserved for nothing to render.
+
+    Glyphs are resolved against the sprite sheet when next fetched after
+    being added, and all glyphs are resolved again if the sprite sheet
+    changes (glyph ids remain valid).
+    """
+
+    def __init__(self, paths):
+        self._paths = paths
+        self._ids = {}
+        self._keys = [None]
+        self._glyphs = [None]
+
+        # The sprite sheet (and its version) the glyphs were resolved against
+        self._sprite_sheet = None
+        self._version = None
+
+        # Incremented each time all glyphs are resolved again (so anything
+        # rendered with the glyphs knows to render again).
+        self._generation = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def id(self, base_type, sprite_id):
+        """Return the glyph id for a sprite (by sprite path id)"""
+
+        if not sprite_id:
+            return 0
+
+        key = (base_type, sprite_id)
+
+        try:
+            return self._ids[key]
+        except KeyError:
+            self._ids[key] = len(self._keys)
+            self._keys.append(key)
+            return self._ids[key]
+
+    def glyphs(self):
+        """
+        Return the list of glyphs (indexed by glyph id), resolving them again
+        if the sprite sheet has changed.
+        """
+
+        sprite_sheet = SpriteSheet.singleton()
+        if (
+            sprite_sheet is not self._sprite_sheet
+            or sprite_sheet.version != self._version
+        ):
+            self._sprite_sheet = sprite_sheet
+            self._version = sprite_sheet.version
+            self._glyphs = [None]
+            self._generation += 1
+
+        # Resolve any glyphs added since we last resolved them
+        if len(self._glyphs) < len(self._keys):
+            self._glyphs.extend(
+                self._resolve(k) for k in self._keys[len(self._glyphs):]
+            )
+
+        return self._glyphs
+
+    def _resolve(self, key):
+        """Return the glyph for a sprite"""
+
+        base_type, sprite_id = key
+        sprite = SpriteSheet.singleton().get(
+            base_type,
+            self._paths.path(sprite_id)
+        )
+
+        if sprite and sprite.character:
+            return (sprite.character, sprite.color_pair | curses.A_BOLD)
+
+
 class SpriteSheet:
     """
     The SpriteSheet class provides functionality for rendering the overworld
@@ -92,16 +228,26 @@ class SpriteSheet:
         }
         self._fallback = None
 
+        # Incremented each time the sheet changes (so anything caching the
+        # sheet's sprites knows to refresh them).
+        self._version = 0
+
+    @property
+    def version(self):
+        return self._version
+
     def set_fallback(self, sprite):
         """
         Set the sprite to return when there are no matches for a given sprite
         path.
         """
         self._fallback = sprite
+        self._version += 1
 
     def add(self, base_type, path, sprite):
         """Add a sprite to the sheet"""
         self._sprites[base_type][path] = sprite
+        self._version += 1
 
     def get(self, base_type, path):
         """Return a sprite based on the given path"""
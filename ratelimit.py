@@ -2,13 +2,44 @@
 A console based 'RateLimit' game client.
 """
 
+import argparse
 import asyncio
+import time
 
 from game.loop import GameLoop
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='Play RateLimit.')
+    parser.add_argument(
+        '--headless',
+        action='store_true',
+        help='Run without a terminal (rendering offscreen) at maximum speed'
+    )
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=None,
+        help='Quit after the given number of game loop iterations'
+    )
+    parser.add_argument(
+        '--screen-size',
+        type=lambda v: tuple(int(d) for d in v.lower().split('x')),
+        default=(40, 120),
+        help='The size of the offscreen window when headless (HxW)'
+    )
+    args = parser.parse_args()
+
     loop = GameLoop()
-    loop.init()
-    asyncio.run(loop.run())
+    loop.init(headless=args.headless, screen_size=args.screen_size)
+
+    start = time.perf_counter()
+    asyncio.run(loop.run(max_iterations=args.iterations))
+    elapsed = time.perf_counter() - start
+
+    if args.headless:
+        print(
+            f'{loop.iterations} iterations in {elapsed:.2f}s '
+            f'({loop.iterations / elapsed:.0f}/s)'
+        )
@@ -0,0 +1,39 @@
+"""
+Tests for the `FrameStore`.
+"""
+
+from game.utils.frames import FrameStore
+
+
+def test_gap_keeps_unconsumed_frames():
+    store = FrameStore(4)
+    store.consume('state', 0)
+
+    for frame_no in range(4):
+        store.add(frame_no, {'frame_no': frame_no})
+
+    # A gap larger than the store doesn't drop the frames not yet consumed
+    store.add(100, {'frame_no': 100})
+
+    assert [store.get(n)['frame_no'] for n in range(1, 4)] == [1, 2, 3]
+    assert store.get(50) is None
+    assert store.get(100)['frame_no'] == 100
+
+    # Once consumed the store shrinks back to its capacity
+    store.consume('state', 100)
+    assert len(store) <= store.capacity
+    assert store.get(100)['frame_no'] == 100
+
+
+def test_gap_restarts_store_once_consumed():
+    store = FrameStore(4)
+
+    for frame_no in range(4):
+        store.add(frame_no, {'frame_no': frame_no})
+    store.consume('state', 3)
+
+    store.add(100, {'frame_no': 100})
+
+    assert store.first_frame_no == 100
+    assert len(store) == 1
+    assert store.get(3) is None
@@ -0,0 +1,94 @@
+"""
+Tests for resuming the game after the connection to the server is lost,
+against the dev server.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from game.clients.blocking import BlockingClient
+from game.clients.non_blocking import NonBlockingClient
+from game.devserver.server import DevServer
+from game.loop import GameLoop
+
+
+NODE = 'test-node'
+
+
+@pytest.fixture
+def server():
+    """A dev server running on its own thread"""
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    server = DevServer()
+    server.loop = loop
+    run(server, server.start(port=0))
+
+    yield server
+
+    run(server, server.stop())
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+def run(server, coroutine):
+    """Run a coroutine on the server's thread and wait for the result"""
+    return asyncio.run_coroutine_threadsafe(coroutine, server.loop).result()
+
+
+def wait_for(condition, timeout=10):
+    """Wait for a condition to be met"""
+
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out'
+        time.sleep(0.01)
+
+
+def test_leader_rejoins_after_reconnect(server):
+    port = server.port
+
+    game = GameLoop()
+    game.init(headless=True)
+    game._client = BlockingClient(
+        NonBlockingClient('127.0.0.1', port, node=NODE)
+    )
+    game.client.connect()
+
+    try:
+        game.client.send(
+            'player:create',
+            {'name': 'Test', 'race': 'dwarf', 'profession': 'mage'}
+        )
+        assert game.join_game()['joined']
+        assert server.world.party_leader == NODE
+
+        # Restart the server, the dev server removes players from the party
+        # when their connection is lost.
+        run(server, server.stop())
+        assert server.world.party_members == []
+
+        wait_for(lambda: game.client.reconnecting)
+        run(server, server.start(port=port))
+
+        wait_for(
+            lambda: game.client.connected and not game.client.reconnecting
+        )
+        asyncio.run(game.resume_frames())
+
+        assert server.world.party_leader == NODE
+        assert server.world.party_members == [NODE]
+
+        # Moves by the leader are applied
+        frame_no = server.world.frame_no
+        game.client.send('move', {'direction': 0})
+        assert server.world.frame_no == frame_no + 1
+
+    finally:
+        game.client.close()
@@ -0,0 +1,125 @@
+"""
+Tests for the pacing of frame replay by the `ReplayScheduler`, driven with
+fake frame times (`dt`).
+"""
+
+import pytest
+
+from game.utils.replay import ReplayScheduler, simulate_catch_up
+
+
+FRAME_RATE = 30
+MAX_FRAME_LAG = 10
+MAX_SPEED = 4
+
+
+def replay_for(scheduler, seconds, lag, dt=0.01):
+    """
+    Return the number of frames replayed over the given time while the
+    player stays the given number of frames behind.
+    """
+
+    frames = 0
+    for i in range(round(seconds / dt)):
+        frames += scheduler.advance(dt, lag)
+    return frames
+
+
+def catch_up(scheduler, backlog, server_frame_rate=0):
+    """Return the time taken to catch up on a backlog of frames"""
+    return simulate_catch_up(scheduler, backlog, server_frame_rate)[0]
+
+
+@pytest.fixture
+def scheduler():
+    return ReplayScheduler(FRAME_RATE, MAX_FRAME_LAG, MAX_SPEED)
+
+
+def test_no_lag(scheduler):
+    assert scheduler.advance(0.1, 0) == 0
+
+    # Time spent with nothing to replay isn't banked
+    assert scheduler.advance(10, 0) == 0
+    assert scheduler.advance(0.01, 1) == 0
+
+
+@pytest.mark.parametrize('dt', [1 / 120, 1 / 60, 1 / 30])
+def test_one_frame_behind_replays_at_frame_rate(scheduler, dt):
+    assert scheduler.speed(0) == 1
+    assert scheduler.speed(1) == 1
+
+    # One frame behind frames are replayed at the replay frame rate (there's
+    # only ever one frame to replay per call so `dt` is at most a frame).
+    assert replay_for(scheduler, 2, 1, dt) == pytest.approx(
+        2 * FRAME_RATE,
+        abs=1
+    )
+
+
+def test_never_replays_more_than_lag(scheduler):
+
+    # A long stall doesn't replay more frames than the player is behind, or
+    # carry more than a frame over to the next call.
+    assert scheduler.advance(5, 3) == 3
+    assert scheduler.advance(0, 3) <= 1
+
+
+def test_speed_increases_with_lag(scheduler):
+    speeds = [scheduler.speed(lag) for lag in range(1, MAX_FRAME_LAG + 1)]
+
+    assert speeds == sorted(speeds)
+    assert len(set(speeds)) == len(speeds)
+    assert speeds[-1] == MAX_SPEED
+
+    # Speed is capped beyond the max frame lag
+    assert scheduler.speed(MAX_FRAME_LAG * 10) == MAX_SPEED
+
+
+def test_replay_accelerates_as_lag_approaches_max_frame_lag(scheduler):
+    rates = []
+    for lag in [1, MAX_FRAME_LAG // 2, MAX_FRAME_LAG - 1, MAX_FRAME_LAG]:
+        scheduler.reset()
+        rates.append(replay_for(scheduler, 1, lag))
+
+    assert rates == sorted(rates)
+    assert rates[0] == pytest.approx(FRAME_RATE, abs=1)
+    assert rates[-1] == pytest.approx(FRAME_RATE * MAX_SPEED, abs=1)
+
+
+def test_max_speed_of_one_keeps_replay_at_frame_rate():
+    scheduler = ReplayScheduler(FRAME_RATE, MAX_FRAME_LAG, 1)
+
+    assert replay_for(scheduler, 1, MAX_FRAME_LAG) == pytest.approx(
+        FRAME_RATE,
+        abs=1
+    )
+
+
+@pytest.mark.parametrize('server_frame_rate', [0, 10, 20])
+@pytest.mark.parametrize('backlog', [1, 5, MAX_FRAME_LAG, 3 * MAX_FRAME_LAG])
+def test_catch_up_time(scheduler, backlog, server_frame_rate):
+    t = catch_up(scheduler, backlog, server_frame_rate)
+
+    # Catching up is no slower than replaying at the frame rate and no
+    # faster than replaying at max speed (plus a frame of slack).
+    slowest = backlog / (FRAME_RATE - server_frame_rate)
+    fastest = backlog / (FRAME_RATE * MAX_SPEED - server_frame_rate)
+
+    assert t is not None
+    assert fastest - 1 / FRAME_RATE <= t <= slowest + 1 / FRAME_RATE
+
+
+@pytest.mark.parametrize('backlog', [5, MAX_FRAME_LAG, 3 * MAX_FRAME_LAG])
+def test_catch_up_faster_than_fixed_rate(scheduler, backlog):
+    fixed = ReplayScheduler(FRAME_RATE, MAX_FRAME_LAG, 1)
+
+    assert catch_up(scheduler, backlog, 10) < catch_up(fixed, backlog, 10)
+
+
+def test_catch_up_time_grows_with_backlog(scheduler):
+    times = []
+    for backlog in [1, 5, MAX_FRAME_LAG, 3 * MAX_FRAME_LAG]:
+        scheduler.reset()
+        times.append(catch_up(scheduler, backlog, 10))
+
+    assert times == sorted(times)